@@ -10,6 +10,7 @@ pip3 install requests -t ./
 pip3 install pytz -t ./
 pip3 install python-twitter -t ./
 pip3 install matplotlib -t ./
+pip3 install numpy -t ./
 zip -r buoy-lambda.zip *
 
 cd -
\ No newline at end of file
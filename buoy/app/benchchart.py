@@ -0,0 +1,93 @@
+import os
+import argparse
+import datetime
+import resource
+import tempfile
+import time
+import multiprocessing
+import pytz
+from concurrent.futures import ProcessPoolExecutor
+
+LOCAL_TZ = pytz.timezone('America/Los_Angeles')
+
+SAMPLES_PER_HOUR = 2
+
+
+def rss_mb():
+    """
+    Current resident set size of this process in megabytes, or peak size where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (FileNotFoundError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_series(days):
+    end = datetime.datetime.now(tz=pytz.utc).replace(minute=0, second=0, microsecond=0)
+    count = days * 24 * SAMPLES_PER_HOUR
+    step = datetime.timedelta(hours=1 / SAMPLES_PER_HOUR)
+    x = [(end - step * (count - n)).astimezone(LOCAL_TZ) for n in range(count)]
+    y = [round(4 + 2 * ((n * 7919) % 100) / 100, 1) for n in range(count)]
+    return x, y
+
+
+def render_pyplot(x, y, title, path):
+    """
+    Previous path: new pyplot figure per chart written to a file and never closed.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    from matplotlib.dates import DateFormatter
+    fig, ax = plt.subplots(figsize=(12, 5))
+    ax.plot(x, y, '-bo')
+    ax.grid(True)
+    ax.set(xlabel="Date", ylabel="Feet", title=title)
+    ax.xaxis.set_minor_locator(mdates.HourLocator(interval=1, tz=LOCAL_TZ))
+    ax.xaxis.set_major_locator(mdates.DayLocator(interval=1, tz=LOCAL_TZ))
+    ax.xaxis.set_major_formatter(DateFormatter("%m/%d", tz=LOCAL_TZ))
+    plt.savefig(path)
+    with open(path, 'rb') as f:
+        return len(f.read())
+
+
+def bench(mode, days, renders):
+    """
+    Render the same chart repeatedly in a fresh process. Return elapsed seconds, RSS before and RSS after.
+    """
+    from buoy.lib import chart
+    x, y = make_series(days)
+    title = chart.window_title(days)
+    before = rss_mb()
+    start = time.perf_counter()
+    if mode == 'pyplot':
+        path = os.path.join(tempfile.mkdtemp(), chart.FILE_NAME)
+        for _ in range(renders):
+            render_pyplot(x, y, title, path)
+    else:
+        renderer = chart.Renderer(LOCAL_TZ)
+        for _ in range(renders):
+            len(renderer.render(x, y, title).getvalue())
+    return time.perf_counter() - start, before, rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--days', help="Chart windows in days", type=int, nargs='*', default=[5, 30, 365])
+    parser.add_argument('-n', '--renders', help="Renders per window, as in a warm container", type=int, default=10)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    for days in args.days:
+        for mode in ['pyplot', 'renderer']:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, before, after = executor.submit(bench, mode, days, args.renders).result()
+            print(f'{mode:>8} {days:>4} days: {elapsed / args.renders * 1000:8.1f} ms/render, '
+                  f'rss {before:6.1f} -> {after:6.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import logging
+import time
+from buoy.lib import dynamo
+from buoy.lib import fakedynamo
+from buoy.lib import parse
+from buoy.lib import synthetic
+
+TABLE = 'buoy-observations'
+BUOY = '46013'
+LAST_YEAR = 2023
+
+# wave height percentiles used as thresholds for last-occurrence lookups, from common to rare
+THRESHOLD_QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+
+class Bench:
+    """
+    Measure operations against a fake DynamoDB client and print one line per operation with latency,
+    throughput, calls, query pages and consumed capacity.
+    """
+
+    def __init__(self, client, years):
+        self.client = client
+        self.years = years
+
+    def measure(self, name, fn, count=1, rows=None):
+        self.client.reset_stats()
+        start = time.perf_counter()
+        result = [fn() for _ in range(count)][-1]
+        elapsed = time.perf_counter() - start
+        stats = self.client.stats
+        calls = sum(stats['calls'].values())
+        rate = f'{round(rows / elapsed):>9,} rows/sec' if rows else ' ' * 18
+        print(f'{self.years:>3} years  {name:<28} {elapsed / count * 1000:>10.2f} ms/op {rate}  '
+              f'calls {calls / count:>8.1f}  pages {stats["pages"] / count:>6.1f}  '
+              f'rcu {stats["read_units"] / count:>9.1f}  wcu {stats["write_units"] / count:>9.1f}')
+        return result
+
+
+def run(years, args):
+    client = fakedynamo.FakeDynamo(latency=args.latency / 1000, unprocessed_rate=args.unprocessed, seed=1)
+    fakedynamo.create_buoy_table(client, TABLE)
+    db = dynamo.Dynamo(client, TABLE, BUOY, concurrency=args.batches)
+    bench = Bench(client, years)
+
+    data_set = [data for _, data in synthetic.years_data(LAST_YEAR - years + 1, years)]
+    rows = sum(data.count('\n') for data in data_set)
+    records = bench.measure('parse', lambda: [r for data in data_set for r in parse.parse_normalize_filter(data)],
+                            rows=rows)
+    bench.measure('convert', lambda: db._convert_items(records), rows=len(records))
+    bench.measure('write_stream', lambda: db.write_stream(records), rows=len(records))
+    bench.measure('rebuild_histograms', lambda: db.rebuild_histograms(records), rows=len(records))
+    bench.measure('rebuild_summary', lambda: db.rebuild_summary(records), rows=len(records))
+    bench.measure('rebuild_index', lambda: db.rebuild_index(records), rows=len(records))
+
+    heights = sorted(record.wave_height for record in records)
+    latest = records[-1]
+    bench.measure('find_latest', db.find_latest, args.repeat)
+    bench.measure('find_max_wave_height', db.find_max_wave_height, args.repeat)
+    bench.measure('month_percentile', lambda: db.query_month_percentile(latest.month, latest.wave_height), args.repeat)
+    bench.measure('month_day_percentile',
+                  lambda: db.query_month_day_percentile(latest.month_day, latest.wave_height), args.repeat)
+    bench.measure('month_scan', lambda: db.query_month(latest.month), args.repeat)
+    bench.measure('month_day_scan', lambda: db.query_month_day(latest.month_day), args.repeat)
+    for quantile in THRESHOLD_QUANTILES:
+        threshold = heights[min(len(heights) - 1, int(len(heights) * quantile))]
+        bench.measure(f'last_occurrence p{quantile * 100:g}', lambda: db.find_last_occurrence_of(threshold),
+                      args.repeat)
+    bench.measure('write_conditional 1 hour', lambda: db.write_conditional(records[-1:]), args.repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-y', '--years', help="Years of synthetic data per run", type=int, nargs='*',
+                        default=[1, 10, 40])
+    parser.add_argument('-n', '--repeat', help="Repetitions of each query", type=int, default=5)
+    parser.add_argument('-l', '--latency', help="Simulated latency of each DynamoDB call in milliseconds",
+                        type=float, default=0)
+    parser.add_argument('-u', '--unprocessed', help="Fraction of batch requests that leave items unprocessed",
+                        type=float, default=0)
+    parser.add_argument('--batches', help="Number of concurrent batch writes", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for years in args.years:
+        run(years, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import gzip
+import time
+from buoy.lib import noaa
+from buoy.lib import noaacache
+from buoy.lib import parse
+from buoy.lib import parsevec
+
+
+def read_file(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        return f.read()
+
+
+def load_data_set(args):
+    if args.files:
+        return [read_file(path) for path in args.files]
+    return [noaa.fetch_buoy_data_year(args.buoy, args.year + n) for n in range(args.count)]
+
+
+def bench(name, fn, data_set, rows):
+    start = time.perf_counter()
+    results = [fn(data) for data in data_set]
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {rows:,} rows in {elapsed:.3f} sec, {round(rows / elapsed):,} rows/sec')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--files', help="Local stdmet files, plain or gzip", nargs='*')
+    parser.add_argument('-b', '--buoy', help="NOAA buoy identifier", default='46013')
+    parser.add_argument('-y', '--year', help="Four-digit first year", type=int, default=1981)
+    parser.add_argument('-c', '--count', help="Number of consecutive years", type=int, default=40)
+    noaacache.add_arguments(parser)
+    args = parser.parse_args()
+    noaacache.check_arguments(parser, args)
+
+    noaa.configure(noaacache.from_args(args))
+
+    data_set = load_data_set(args)
+    rows = sum(len(data.splitlines()) for data in data_set)
+
+    expected = bench('parse', parse.parse_normalize_filter, data_set, rows)
+    actual = bench('parsevec', parsevec.parse_normalize_filter, data_set, rows)
+    print(f'identical output: {expected == actual}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import argparse
+import logging
+import os
+import boto3
+from buoy.lib import dynamo
+from buoy.lib import snapshot
+from buoy.lib import loginit
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--table', help="DynamoDB table name", required=True)
+    parser.add_argument('-r', '--region', help="DynamoDB table region", required=True)
+    parser.add_argument('-b', '--buoy', help="NOAA buoy identifier", required=True)
+    parser.add_argument('-d', '--directory', help="Snapshot directory", required=True)
+    parser.add_argument('-p', '--prefix', help="Log file prefix", required=True)
+    parser.add_argument('-w', '--window', help="Hours before the high-water time to read again, picking up "
+                                                 "observations updated in place", type=int, default=45 * 24)
+    args = parser.parse_args()
+
+    loginit.init_logger(args.prefix)
+    logger.info(f'args: {args}')
+
+    client = boto3.client('dynamodb', region_name=args.region)
+    snap = snapshot.Snapshot(os.path.join(args.directory, args.buoy))
+    db = dynamo.Dynamo(client, args.table, args.buoy, snap)
+
+    snap.refresh(db, args.window)
+    logger.info(f'snapshot has {len(snap)} rows, high-water time is {snap.high_water()}')
+
+
+if __name__ == '__main__':
+    main()
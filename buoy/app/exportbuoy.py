@@ -0,0 +1,41 @@
+import argparse
+import logging
+import boto3
+from buoy.lib import archive
+from buoy.lib import dynamo
+from buoy.lib import loginit
+from buoy.lib import sqlitedb
+from buoy.lib import storage
+from buoy.lib import trace
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--table', help="DynamoDB table name")
+    parser.add_argument('-r', '--region', help="DynamoDB table region")
+    parser.add_argument('-b', '--buoy', help="NOAA buoy identifier", required=True)
+    parser.add_argument('-f', '--file', help="Export file, conventionally ending in .npz", required=True)
+    parser.add_argument('-p', '--prefix', help="Log file prefix", required=True)
+    trace.add_arguments(parser)
+    storage.add_arguments(parser)
+    args = parser.parse_args()
+    storage.check_arguments(parser, args)
+
+    loginit.init_logger(args.prefix)
+    logger.info(f'args: {args}')
+
+    if args.sqlite:
+        db = sqlitedb.SqliteDb(args.sqlite, args.buoy)
+    else:
+        client = boto3.client('dynamodb', region_name=args.region)
+        db = dynamo.Dynamo(client, args.table, args.buoy)
+
+    with trace.session('exportbuoy', args.trace):
+        observations, index_items = trace.call('export', archive.export, db, args.file)
+    logger.info(f'exported {observations} observations and {index_items} index items to {args.file}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,57 @@
 import os
 import logging
-import boto3
 import datetime
-import pytz
-import twitter
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.dates import DateFormatter
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from buoy.lib import dynamo
+from buoy.lib import metrics
 from buoy.lib import noaa
 from buoy.lib import parse
+from buoy.lib import trace
+
+# boto3, pytz, twitter, matplotlib and numpy (via snapshot) are imported where they are used,
+# so an invocation that exits early never pays for loading them. See startup.py.
 
 logger = logging.getLogger(__name__)
 
 FEET_PER_METER = 3.28084
 
-LOCAL_TZ = pytz.timezone('America/Los_Angeles')
+LOCAL_TZ_NAME = 'America/Los_Angeles'
+
+CHART_DAYS = 5
+
+MAX_BUOY_WORKERS = 16
+
+# threads running the independent stages of one buoy concurrently, see run_concurrent
+STAGE_WORKERS = 4
 
-TMP_FILE = '/tmp/waves.png'
+# botocore default, kept as the minimum DynamoDB connection pool size
+MIN_POOL_CONNECTIONS = 10
+
+# guards the lazy creation of the chart renderer shared by concurrently processed buoys
+_renderer_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def local_tz():
+    import pytz
+    return pytz.timezone(LOCAL_TZ_NAME)
+
+
+def chart_renderer():
+    """
+    Return chart renderer kept for the life of the container, so warm invocations reuse its figure.
+    Buoys processed concurrently share it, and its renders are serialized.
+    """
+    with _renderer_lock:
+        return _chart_renderer()
+
+
+@functools.lru_cache(maxsize=None)
+def _chart_renderer():
+    from buoy.lib import chart
+    return chart.Renderer(local_tz())
 
 
 def init_logging():
@@ -51,6 +85,10 @@ def first_sentence(latest, pacific_time):
 def second_sentence(db, latest, pacific_time):
     month_per = db.query_month_percentile(latest['month'], latest['wave_height'])
     month_day_per = db.query_month_day_percentile(latest['month_day'], latest['wave_height'])
+    return format_second_sentence(month_per, month_day_per, pacific_time)
+
+
+def format_second_sentence(month_per, month_day_per, pacific_time):
     month = pacific_time.strftime('%b')
     month_day = pacific_time.strftime('%b %-d')
     return (f'The wave height meets or exceeds {month_per[0]} percent ({month_per[1]:,}/{month_per[2]:,}) of records for {month} '
@@ -58,7 +96,10 @@ def second_sentence(db, latest, pacific_time):
 
 
 def third_sentence(db, latest):
-    item = db.find_last_occurrence_of(latest['wave_height'])
+    return format_third_sentence(db.find_last_occurrence_of(latest['wave_height']))
+
+
+def format_third_sentence(item):
     if item:
         pacific_time = table_item_pacific_time(item)
         date = pacific_time.strftime('%-I:%M %p on %b %-d, %Y')
@@ -75,6 +116,22 @@ def write_paragraph(db, latest):
             f'{third_sentence(db, latest)}')
 
 
+def write_paragraph_concurrent(db, latest, executor):
+    """
+    Write paragraph with the percentile and last-occurrence queries running concurrently in executor.
+    """
+    month_per = trace.submit(
+        executor, 'query_month_percentile', db.query_month_percentile, latest['month'], latest['wave_height'])
+    month_day_per = trace.submit(
+        executor, 'query_month_day_percentile', db.query_month_day_percentile, latest['month_day'], latest['wave_height'])
+    last = trace.submit(
+        executor, 'find_last_occurrence_of', db.find_last_occurrence_of, latest['wave_height'])
+    pacific_time = noaa_record_pacific_time(latest)
+    return (f'{first_sentence(latest, pacific_time)}'
+            f'{format_second_sentence(month_per.result(), month_day_per.result(), pacific_time)}'
+            f'{format_third_sentence(last.result())}')
+
+
 def table_item_pacific_time(item):
     return datetime.datetime(
         int(item['year']['N']),
@@ -82,7 +139,7 @@ def table_item_pacific_time(item):
         int(item['day']['N']),
         int(item['hour']['N']),
         int(item['minute']['N']),
-        tzinfo=pytz.utc).astimezone(LOCAL_TZ)
+        tzinfo=datetime.timezone.utc).astimezone(local_tz())
 
 
 def noaa_record_pacific_time(record):
@@ -92,69 +149,200 @@ def noaa_record_pacific_time(record):
         record['day'],
         record['hour'],
         record['minute'],
-        tzinfo=pytz.utc).astimezone(LOCAL_TZ)
+        tzinfo=datetime.timezone.utc).astimezone(local_tz())
+
 
+def make_plot(records, days=CHART_DAYS):
+    """
+    Render chart of records into an in-memory PNG buffer.
+    """
+    from buoy.lib import chart
 
-def make_plot(records):
+    records = sorted(records, key=lambda rec: rec['time'])
     x = [noaa_record_pacific_time(rec) for rec in records]
     y = [round(rec['wave_height'] * FEET_PER_METER, 1) for rec in records]
-    fig, ax = plt.subplots(figsize=(12, 5))
-    ax.plot(x, y, '-bo')
-    ax.grid(True)
-    ax.set(xlabel="Date", ylabel="Feet", title="Significant Wave Height - Last 5 Days")
-    ax.xaxis.set_minor_locator(mdates.HourLocator(interval=1, tz=LOCAL_TZ))
-    ax.xaxis.set_major_locator(mdates.DayLocator(interval=1, tz=LOCAL_TZ))
-    ax.xaxis.set_major_formatter(DateFormatter("%m/%d", tz=LOCAL_TZ))
-    plt.savefig(TMP_FILE)
-    return TMP_FILE
+    return chart_renderer().render(x, y, chart.window_title(days))
 
 
 def tweet(message, records, twitter_credentials):
-    file_name = make_plot(records)
-    with open(file_name, 'rb') as f:
-        api = twitter.Api(**twitter_credentials)
-        status = api.PostUpdate(message, media=f)
-        logger.info(f'posted twitter update with id {status.id} and create time {status.created_at}')
+    post(message, trace.call('make_plot', make_plot, records), twitter_credentials)
 
 
-def main(table, buoy, twitter_credentials=None):
-    init_logging()
-    client = boto3.client('dynamodb')
-    db = dynamo.Dynamo(client, table, buoy)
+def post(message, media, twitter_credentials):
+    import twitter
+
+    api = twitter.Api(**twitter_credentials)
+    status = api.PostUpdate(message, media=media)
+    logger.info(f'posted twitter update with id {status.id} and create time {status.created_at}')
+
 
-    db_latest = db.find_latest()
+def fetch_records(buoy):
+    """
+    Fetch and parse last 5 days of observations. Return None if the file is unchanged since the last fetch
+    by this container.
+    """
+    with trace.span('fetch'):
+        data = noaa.fetch_buoy_data_last5(buoy, conditional=True)
+    if data is None:
+        return None
+    return trace.call('parse', parse.parse_normalize_filter_complete, data)
+
+
+def find_difference(db_latest, noaa_records):
     logger.info(f'queried latest from dynamodb, time is {db_latest["time"]["S"]}')
 
-    noaa_records = parse.parse_normalize_filter_complete(noaa.fetch_buoy_data_last5(buoy))
     noaa_latest = max(noaa_records, key=lambda r: r['time'])
     logger.info(f'fetched 5 days of buoy observations, latest record time is {noaa_latest["time"]}')
 
     difference = [record for record in noaa_records if record['time'] > db_latest['time']['S']]
+    return noaa_latest, difference
+
+
+def main(table, buoys, twitter_credentials=None, concurrent=False, snapshot_dir=None, trace_dir=None,
+         sqlite_path=None):
+    """
+    Process a buoy or list of buoys. Buoys are processed concurrently with a shared DynamoDB client and NOAA session.
+    The DynamoDB connection pool is sized to the number of buoy and stage threads sharing the client.
+    A failing buoy does not interrupt the others. Failures are raised after all buoys finish.
+    DynamoDB metrics of every logical operation are printed as CloudWatch EMF lines at the end.
+    Stages are traced as nested spans. If a trace directory is given, profiles are captured and written there.
+    If a SQLite database path is given, observations are read from and written to it instead of the DynamoDB table.
+    """
+    init_logging()
+    if isinstance(buoys, str):
+        buoys = [buoys]
+    workers = min(len(buoys), MAX_BUOY_WORKERS)
+    client = None
+    if not sqlite_path:
+        client = metrics.InstrumentedClient(dynamodb_client(workers * (STAGE_WORKERS if concurrent else 1)))
+
+    with trace.session('lambda', trace_dir):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {buoy: trace.submit(executor, f'buoy {buoy}', process, client, table, buoy,
+                                          twitter_credentials, concurrent, snapshot_dir, sqlite_path)
+                       for buoy in buoys}
+    metrics.RECORDER.emit()
+
+    failed = [buoy for buoy, future in futures.items() if future.exception()]
+    if failed:
+        raise RuntimeError(f'failed to process buoys {failed}') from futures[failed[0]].exception()
+
+
+def dynamodb_client(connections):
+    """
+    Make DynamoDB client with a connection pool large enough for the number of threads sharing it,
+    so concurrent requests do not wait for a connection or reconnect.
+    """
+    import boto3
+    from botocore.config import Config
+    return boto3.client('dynamodb', config=Config(max_pool_connections=max(connections, MIN_POOL_CONNECTIONS)))
+
+
+def process(client, table, buoy, twitter_credentials, concurrent, snapshot_dir, sqlite_path):
+    if sqlite_path:
+        from buoy.lib import sqlitedb
+        db = sqlitedb.SqliteDb(sqlite_path, buoy)
+    else:
+        snap = None
+        if snapshot_dir:
+            from buoy.lib import snapshot
+            snap = snapshot.Snapshot(os.path.join(snapshot_dir, buoy))
+            if len(snap) == 0:
+                # building the whole history would query every item in the tweet path, see buildsnapshot.py
+                logger.warning(f'no snapshot in {snap.path}, answering queries from DynamoDB')
+                snap = None
+        db = dynamo.Dynamo(client, table, buoy, snap, cache=dynamo.QUERY_CACHE)
+
+    try:
+        if concurrent:
+            run_concurrent(db, buoy, twitter_credentials)
+        else:
+            run(db, buoy, twitter_credentials)
+    except Exception:
+        logger.exception(f'failed to process buoy {buoy}')
+        noaa.forget_buoy_data_last5(buoy)
+        raise
+
+
+def run(db, buoy, twitter_credentials):
+    """
+    Run each stage one after another.
+    """
+    noaa_records = trace.call('fetch_records', fetch_records, buoy)
+    if noaa_records is None:
+        logger.info(f'buoy observations unchanged since last invocation, exiting')
+        return
+
+    db_latest = trace.call('find_latest', db.find_latest)
+    noaa_latest, difference = find_difference(db_latest, noaa_records)
 
     if not difference:
         logger.info(f'no new buoy observations, exiting')
         return
 
-    paragraph = write_paragraph(db, noaa_latest)
+    if db.snapshot is not None:
+        with metrics.scope(buoy, 'refresh_snapshot'):
+            trace.call('refresh_snapshot', db.snapshot.refresh, db)
+
+    paragraph = trace.call('write_paragraph', write_paragraph, db, noaa_latest)
     logger.info(paragraph)
     logger.info(f'twitter update length is {len(paragraph)} characters')
 
-    db.write_conditional(difference)
+    trace.call('write_conditional', db.write_conditional, difference)
 
     if twitter_credentials:
-        tweet(paragraph, noaa_records, twitter_credentials)
+        trace.call('tweet', tweet, paragraph, noaa_records, twitter_credentials)
+
+
+def run_concurrent(db, buoy, twitter_credentials):
+    """
+    Run independent stages concurrently. Queries complete before writes begin, so the paragraph
+    describes the same table state as a serial run.
+    """
+    with ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix=buoy) as executor:
+        db_latest_future = trace.submit(executor, 'find_latest', db.find_latest)
+        noaa_records_future = trace.submit(executor, 'fetch_records', fetch_records, buoy)
+        noaa_records = noaa_records_future.result()
+        if noaa_records is None:
+            logger.info(f'buoy observations unchanged since last invocation, exiting')
+            return
+
+        noaa_latest, difference = find_difference(db_latest_future.result(), noaa_records)
+
+        if not difference:
+            logger.info(f'no new buoy observations, exiting')
+            return
+
+        if db.snapshot is not None:
+            with metrics.scope(buoy, 'refresh_snapshot'):
+                trace.call('refresh_snapshot', db.snapshot.refresh, db)
+
+        paragraph = trace.call('write_paragraph', write_paragraph_concurrent, db, noaa_latest, executor)
+        logger.info(paragraph)
+        logger.info(f'twitter update length is {len(paragraph)} characters')
+
+        write = trace.submit(executor, 'write_conditional', db.write_conditional, difference)
+        plot = trace.submit(executor, 'make_plot', make_plot, noaa_records) if twitter_credentials else None
+        write.result()
+
+        if plot:
+            trace.call('post', post, paragraph, plot.result(), twitter_credentials)
 
 
 def lambda_handler(event, context):
-    table = os.environ['table']
-    buoy = os.environ['buoy']
+    table = os.environ.get('table')
+    buoys = [buoy.strip() for buoy in (os.environ.get('buoys') or os.environ['buoy']).split(',') if buoy.strip()]
     twitter_credentials = {
         'consumer_key': os.environ['twitter_consumer_key'],
         'consumer_secret': os.environ['twitter_secret_key'],
         'access_token_key': os.environ['twitter_access_token_key'],
         'access_token_secret': os.environ['twitter_access_token_secret']
     }
-    main(table, buoy, twitter_credentials)
+    concurrent = os.environ.get('concurrent', 'false').lower() == 'true'
+    snapshot_dir = os.environ.get('snapshot')
+    trace_dir = os.environ.get('trace')
+    sqlite_path = os.environ.get('sqlite')
+    main(table, buoys, twitter_credentials, concurrent, snapshot_dir, trace_dir, sqlite_path)
 
 
 if __name__ == '__main__':
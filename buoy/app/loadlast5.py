@@ -3,28 +3,48 @@ import logging
 import boto3
 from buoy.lib import dynamo
 from buoy.lib import noaa
-from buoy.lib import parse
+from buoy.lib import parsevec
 from buoy.lib import loginit
+from buoy.lib import metrics
+from buoy.lib import noaacache
+from buoy.lib import sqlitedb
+from buoy.lib import storage
+from buoy.lib import trace
 
 logger = logging.getLogger(__name__)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-t', '--table', help="DynamoDB table name", required=True)
-    parser.add_argument('-r', '--region', help="DynamoDB table region", required=True)
+    parser.add_argument('-t', '--table', help="DynamoDB table name")
+    parser.add_argument('-r', '--region', help="DynamoDB table region")
     parser.add_argument('-b', '--buoy', help="NOAA buoy identifier", required=True)
     parser.add_argument('-p', '--prefix', help="Log file prefix", required=True)
+    parser.add_argument('--batches', help="Number of concurrent DynamoDB batch writes", type=int, default=1)
+    noaacache.add_arguments(parser)
+    parsevec.add_arguments(parser)
+    trace.add_arguments(parser)
+    storage.add_arguments(parser)
     args = parser.parse_args()
+    storage.check_arguments(parser, args)
+    noaacache.check_arguments(parser, args)
 
     loginit.init_logger(args.prefix)
     logger.info(f'args: {args}')
 
-    client = boto3.client('dynamodb', region_name=args.region)
-    db = dynamo.Dynamo(client, args.table, args.buoy)
+    noaa.configure(noaacache.from_args(args))
 
-    records = parse.parse_normalize_filter(noaa.fetch_buoy_data_last5(args.buoy))
-    db.write_conditional(records)
+    if args.sqlite:
+        db = sqlitedb.SqliteDb(args.sqlite, args.buoy)
+    else:
+        client = metrics.InstrumentedClient(boto3.client('dynamodb', region_name=args.region))
+        db = dynamo.Dynamo(client, args.table, args.buoy, concurrency=args.batches)
+
+    with trace.session('loadlast5', args.trace):
+        data = trace.call('fetch', noaa.fetch_buoy_data_last5, args.buoy)
+        records = trace.call('parse', parsevec.from_args(args).parse_normalize_filter, data)
+        trace.call('upsert', db.upsert, records)
+    metrics.RECORDER.emit()
 
 
 if __name__ == '__main__':
@@ -4,34 +4,98 @@ import boto3
 from buoy.lib import dynamo
 from buoy.lib import noaa
 from buoy.lib import parse
+from buoy.lib import parsevec
 from buoy.lib import loginit
+from buoy.lib import metrics
+from buoy.lib import noaacache
+from buoy.lib import sqlitedb
+from buoy.lib import storage
+from buoy.lib import trace
+from buoy.lib import backfill
+from buoy.lib import capacity
 
 logger = logging.getLogger(__name__)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-t', '--table', help="DynamoDB table name", required=True)
-    parser.add_argument('-r', '--region', help="DynamoDB table region", required=True)
+    parser.add_argument('-t', '--table', help="DynamoDB table name")
+    parser.add_argument('-r', '--region', help="DynamoDB table region")
     parser.add_argument('-y', '--year', help="Four-digit year", type=int, required=True)
     parser.add_argument('-m', '--month', help="Three-letter month name", required=True)
     parser.add_argument('-c', '--count', help="Number of consecutive months", type=int, required=True)
     parser.add_argument('-b', '--buoy', help="NOAA buoy identifier", required=True)
     parser.add_argument('-p', '--prefix', help="Log file prefix", required=True)
+    parser.add_argument('--batches', help="Number of concurrent DynamoDB batch writes", type=int, default=1)
+    parser.add_argument('--fetchers', help="Number of concurrent NOAA fetches. Setting --fetchers, --parsers, "
+                                           "--writers or --processes runs a pipelined backfill, which holds whole "
+                                           "month files and their parsed records in memory, one per worker and queue "
+                                           "slot, instead of streaming each file in chunks", type=int, default=1)
+    parser.add_argument('--parsers', help="Number of concurrent parsers", type=int, default=1)
+    parser.add_argument('--writers', help="Number of concurrent DynamoDB writers", type=int, default=1)
+    parser.add_argument('--processes', help="Parse in a process pool", action='store_true')
+    parser.add_argument('--rcu', help="Read capacity units per second budget", type=float)
+    parser.add_argument('--wcu', help="Write capacity units per second budget", type=float)
+    parser.add_argument('--plan', help="Estimate capacity and time without loading, for the histograms and summary "
+                                       "built on --table if given", action='store_true')
+    noaacache.add_arguments(parser)
+    parsevec.add_arguments(parser)
+    trace.add_arguments(parser)
+    storage.add_arguments(parser)
     args = parser.parse_args()
+    storage.check_arguments(parser, args)
+    noaacache.check_arguments(parser, args)
 
     loginit.init_logger(args.prefix)
     logger.info(f'args: {args}')
 
+    noaa.configure(noaacache.from_args(args))
+
     month = noaa.resolve_month(args.month)
 
-    client = boto3.client('dynamodb', region_name=args.region)
-    db = dynamo.Dynamo(client, args.table, args.buoy)
+    if args.plan:
+        histograms, summary = False, False
+        if args.table and not args.sqlite:
+            target = dynamo.Dynamo(boto3.client('dynamodb', region_name=args.region), args.table, args.buoy)
+            histograms, summary = target.aggregates_built()
+        estimate = capacity.plan([(args.year, month[0] + n) for n in range(args.count)], args.wcu, args.rcu,
+                                 dynamo.STREAM_CHUNK_SIZE, histograms, summary)
+        logger.info(f'plan: {estimate}')
+        print(capacity.describe_plan(estimate))
+        return
+
+    client = None
+    if args.sqlite:
+        db = sqlitedb.SqliteDb(args.sqlite, args.buoy)
+    else:
+        client = metrics.InstrumentedClient(boto3.client('dynamodb', region_name=args.region))
+        if args.rcu or args.wcu:
+            client = capacity.LimitedClient(client, args.rcu, args.wcu)
+        db = dynamo.Dynamo(client, args.table, args.buoy, concurrency=args.batches)
+
+    months = [noaa.MONTHS[month[0] + n - 1] for n in range(args.count)]
+
+    with trace.session('loadyearmonths', args.trace):
+        if args.fetchers == args.parsers == args.writers == 1 and not args.processes and args.parser == 'parse':
+            for m in months:
+                records = parse.parse_normalize_filter_stream(noaa.stream_buoy_data_year_month(args.buoy, args.year, m))
+                trace.call(f'month {m}', db.write_stream, records)
+        else:
+            trace.call(
+                'backfill',
+                backfill.run,
+                months,
+                lambda m: noaa.fetch_buoy_data_year_month(args.buoy, args.year, m),
+                parsevec.from_args(args).parse_normalize_filter,
+                db.write_stream,
+                args.fetchers,
+                args.parsers,
+                args.writers,
+                args.processes)
+    metrics.RECORDER.emit()
 
-    for n in range(args.count):
-        m = noaa.MONTHS[month[0] + n - 1]
-        records = parse.parse_normalize_filter(noaa.fetch_buoy_data_year_month(args.buoy, args.year, m))
-        db.write(records)
+    if isinstance(client, capacity.LimitedClient):
+        logger.info(f'consumed capacity units: {client.consumed}')
 
 
 if __name__ == '__main__':
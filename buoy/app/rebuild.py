@@ -0,0 +1,36 @@
+import argparse
+import logging
+import boto3
+from buoy.lib import dynamo
+from buoy.lib import loginit
+
+logger = logging.getLogger(__name__)
+
+TARGETS = ['histograms', 'index', 'summary']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--table', help="DynamoDB table name", required=True)
+    parser.add_argument('-r', '--region', help="DynamoDB table region", required=True)
+    parser.add_argument('-b', '--buoy', help="NOAA buoy identifier", required=True)
+    parser.add_argument('-p', '--prefix', help="Log file prefix", required=True)
+    parser.add_argument('-w', '--what', help="Embedded items to rebuild", nargs='*', choices=TARGETS, default=TARGETS)
+    args = parser.parse_args()
+
+    loginit.init_logger(args.prefix)
+    logger.info(f'args: {args}')
+
+    client = boto3.client('dynamodb', region_name=args.region)
+    db = dynamo.Dynamo(client, args.table, args.buoy)
+
+    if 'histograms' in args.what:
+        db.rebuild_histograms()
+    if 'index' in args.what:
+        db.rebuild_index()
+    if 'summary' in args.what:
+        db.rebuild_summary()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import re
+import sys
+import argparse
+import subprocess
+
+DEFAULT_MODULE = 'buoy.app.lambda'
+
+# dependencies that only the tweet path needs, so the early-exit path must not import them
+DEFAULT_FORBIDDEN = ['matplotlib', 'twitter', 'numpy']
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+PROFILE_CODE = '''
+import time, importlib
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(time.perf_counter() - start)
+'''
+
+
+def profile(module):
+    """
+    Import module in a fresh interpreter run with -X importtime.
+    Return total import wall time in seconds and list of (name, self us, cumulative us, depth) entries.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROFILE_CODE.format(module=module)],
+        capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            entries.append((name, int(own), int(cumulative), len(indent) // 2))
+    if result.returncode != 0:
+        raise RuntimeError(f'import of {module} failed:\n{result.stderr[-2000:]}')
+    return float(result.stdout.strip().splitlines()[-1]), entries
+
+
+def package_totals(entries):
+    """
+    Sum self import time of entries by top-level package.
+    """
+    totals = {}
+    for name, own, _, _ in entries:
+        package = name.split('.')[0]
+        totals[package] = totals.get(package, 0) + own
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--module', help="Module to profile", default=DEFAULT_MODULE)
+    parser.add_argument('-n', '--top', help="Number of modules and packages to report", type=int, default=15)
+    parser.add_argument('-b', '--budget', help="Fail if total import time exceeds this many milliseconds", type=int)
+    parser.add_argument('-f', '--forbid', help="Fail if any of these packages is imported", nargs='*',
+                        default=DEFAULT_FORBIDDEN)
+    args = parser.parse_args()
+
+    wall, entries = profile(args.module)
+    total_ms = wall * 1000
+
+    print(f'{args.module}: {len(entries)} modules imported in {total_ms:.1f} ms')
+    print()
+    print('slowest modules (cumulative ms, self ms):')
+    for name, own, cumulative, _ in sorted(entries, key=lambda e: e[2], reverse=True)[:args.top]:
+        print(f'  {cumulative / 1000:8.1f} {own / 1000:8.1f}  {name}')
+    print()
+    print('packages (self ms):')
+    for package, own in sorted(package_totals(entries).items(), key=lambda e: e[1], reverse=True)[:args.top]:
+        print(f'  {own / 1000:8.1f}  {package}')
+
+    failures = []
+    imported = {name.split('.')[0] for name, _, _, _ in entries}
+    for package in args.forbid:
+        if package in imported:
+            failures.append(f'forbidden package {package} imported')
+    if args.budget is not None and total_ms > args.budget:
+        failures.append(f'import time {total_ms:.1f} ms exceeds budget of {args.budget} ms')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import array
+import logging
+import numpy as np
+from buoy.lib import dynamo
+from buoy.lib import snapshot
+from buoy.lib.observation import Observation
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# prefix of the columns of year-month index items, which hold the observation with the max wave height of a month
+INDEX_PREFIX = 'index_'
+
+# array module type code of each snapshot column type
+TYPECODES = {np.uint32: 'I', np.int8: 'b', np.int16: 'h'}
+
+
+def _empty_columns():
+    return {name: array.array(TYPECODES[dtype]) for name, dtype, _ in snapshot.COLUMNS}
+
+
+def _append(columns, row):
+    for (name, _, _), value in zip(snapshot.COLUMNS, row):
+        columns[name].append(value)
+
+
+def _arrays(columns, prefix=''):
+    return {f'{prefix}{name}': np.asarray(columns[name], dtype=dtype) for name, dtype, _ in snapshot.COLUMNS}
+
+
+def _index_item_observation(item):
+    """
+    Make item of the observation held by an inline index item, whose time key is the period it covers.
+    """
+    time = f'{int(item["year"]["N"]):04d}{int(item["month"]["N"]):02d}{int(item["day"]["N"]):02d}' \
+           f'{int(item["hour"]["N"]):02d}'
+    return dict(item, time={'S': time})
+
+
+def export(db, path):
+    """
+    Stream all observation items of the buoy of storage db into a compressed NumPy .npz file at path, with one array
+    per snapshot column. If db is a Dynamo, year-month index items are exported as well, as index_key holding
+    the YYYYMM key and index_-prefixed observation columns. Rows are held in compact typed arrays while reading.
+    Return number of observations and index items exported.
+    """
+    rows = _empty_columns()
+    for item in db.query_items_after('0'):
+        _append(rows, snapshot.decode(item))
+    logger.info(f'read {len(rows["time"])} observation items of buoy {db.buoy}')
+
+    index_keys = array.array('I')
+    index = _empty_columns()
+    if isinstance(db, dynamo.Dynamo):
+        for item in db.query_index_items(dynamo.INDEX_YEAR_MONTH):
+            index_keys.append(int(item['time']['S']))
+            _append(index, snapshot.decode(_index_item_observation(item)))
+        logger.info(f'read {len(index_keys)} year-month index items of buoy {db.buoy}')
+
+    np.savez_compressed(
+        path,
+        version=np.array(FORMAT_VERSION),
+        buoy=np.array(db.buoy),
+        index_key=np.asarray(index_keys, dtype=np.uint32),
+        **_arrays(rows),
+        **_arrays(index, INDEX_PREFIX))
+    return len(rows['time']), len(index_keys)
+
+
+def _records(columns, maxima):
+    """
+    Generate observation records with time keys from column value lists, recording the first record with
+    the max wave height of each year-month in maxima, as Dynamo does when it builds the index.
+    """
+    scales = [scale for _, _, scale in snapshot.COLUMNS[2:]]
+    for time, minute, *values in zip(*(columns[name] for name, _, _ in snapshot.COLUMNS)):
+        key = str(time)
+        values = [None if value == snapshot.MISSING else value / scale for value, scale in zip(values, scales)]
+        record = Observation(int(key[:4]), int(key[4:6]), int(key[6:8]), int(key[8:10]), minute, *values)
+        record.time = key
+        record.year_month = key[:6]
+        record.month_day = key[4:8]
+        if key[:6] not in maxima or record.wave_height > maxima[key[:6]].wave_height:
+            maxima[key[:6]] = record
+        yield record
+
+
+def load(db, path):
+    """
+    Import observations of a file made by export into storage db with its write_stream, which writes items
+    in batches and computes index items locally, without fetching or parsing NOAA data.
+    If db is a Dynamo, histogram, summary and index items are then rebuilt and marked complete, from the file alone
+    if the buoy had no items before the import and from a full scan otherwise.
+    Year-month index items recomputed from the observations are checked against those in the file.
+    Return number of observations imported.
+    """
+    with np.load(path) as data:
+        if int(data['version']) != FORMAT_VERSION:
+            raise ValueError(f'unsupported export format version {int(data["version"])} in {path}')
+        buoy = str(data['buoy'])
+        columns = {name: data[name].tolist() for name, _, _ in snapshot.COLUMNS}
+        index_keys = data['index_key'].tolist()
+        index_times = data[f'{INDEX_PREFIX}time'].tolist()
+        index_heights = data[f'{INDEX_PREFIX}waveheight'].tolist()
+
+    if buoy != db.buoy:
+        logger.info(f'importing observations of buoy {buoy} into buoy {db.buoy}')
+    empty = db.find_latest() is None
+    maxima = {}
+    db.write_stream(_records(columns, maxima))
+    logger.info(f'imported {len(columns["time"])} observations from {path}')
+    if isinstance(db, dynamo.Dynamo):
+        db.rebuild_histograms(_records(columns, {}) if empty else None)
+        db.rebuild_summary(_records(columns, {}) if empty else None)
+        db.rebuild_index(_records(columns, {}) if empty else None)
+
+    mismatched = [key for key, time, height in zip(index_keys, index_times, index_heights)
+                  if str(key) not in maxima
+                  or maxima[str(key)].time != str(time)
+                  or round(maxima[str(key)].wave_height * 100) != height]
+    if mismatched:
+        logger.warning(f'{len(mismatched)} of {len(index_keys)} exported year-month index items differ from '
+                       f'the recomputed index, first is {mismatched[0]}')
+    return len(columns['time'])
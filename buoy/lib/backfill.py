@@ -0,0 +1,83 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+def _worker(name, fn, source, target, errors):
+    """
+    Take (job, value) entries from source queue, apply function and put (job, result) entries into target queue.
+    """
+    while True:
+        entry = source.get()
+        if entry is _DONE:
+            return
+        job, value = entry
+        try:
+            result = fn(value)
+        except Exception as e:
+            logger.exception(f'{name} stage failed for job {job}')
+            errors.append(e)
+            continue
+        logger.info(f'{name} stage completed job {job}')
+        if target is not None:
+            target.put((job, result))
+
+
+def _start(name, count, fn, source, target, errors):
+    threads = [threading.Thread(target=_worker, name=f'{name}-{n}', args=(name, fn, source, target, errors))
+               for n in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _finish(threads, source):
+    """
+    Signal stage workers reading from source queue to exit and wait for them.
+    """
+    for _ in threads:
+        source.put(_DONE)
+    for thread in threads:
+        thread.join()
+
+
+def run(jobs, fetch, parse, write, fetchers=1, parsers=1, writers=1, processes=False, queue_size=QUEUE_SIZE):
+    """
+    Run backfill jobs through fetch, parse and write stages, each with its own pool of worker threads.
+    Stages are connected by bounded queues, so a slow stage applies backpressure to the stages before it.
+    Function fetch maps job to data, parse maps data to records and write stores records.
+    If processes is set, parse runs in a process pool to avoid the GIL and must be picklable.
+    All jobs are attempted. The first error, if any, is raised after all stages finish.
+    """
+    errors = []
+    job_queue = queue.Queue()
+    parse_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+
+    for job in jobs:
+        job_queue.put((job, job))
+
+    pool = ProcessPoolExecutor(max_workers=parsers) if processes else None
+    parse_fn = (lambda data: pool.submit(parse, data).result()) if pool else parse
+
+    try:
+        fetch_threads = _start('fetch', fetchers, fetch, job_queue, parse_queue, errors)
+        parse_threads = _start('parse', parsers, parse_fn, parse_queue, write_queue, errors)
+        write_threads = _start('write', writers, write, write_queue, None, errors)
+        _finish(fetch_threads, job_queue)
+        _finish(parse_threads, parse_queue)
+        _finish(write_threads, write_queue)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if errors:
+        logger.error(f'{len(errors)} backfill stage failures')
+        raise errors[0]
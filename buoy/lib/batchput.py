@@ -1,10 +1,17 @@
 import time
 import logging
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from botocore.exceptions import ClientError
 
 FIRST_BACKOFF = 0.1  # 100ms, 200ms, 400ms, ...
 MAX_BACKOFF = 5
 
 DYNAMO_CHUNK_SIZE = 25
+DYNAMO_GET_CHUNK_SIZE = 100
+
+THROTTLE_ERROR_CODES = ['ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded']
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +38,10 @@ def _partition(list):
     return [list[x:x + DYNAMO_CHUNK_SIZE] for x in range(0, len(list), DYNAMO_CHUNK_SIZE)]
 
 
-def batch_put_items(dynamo, table_name, items):
+def batch_put_items(dynamo, table_name, items, concurrency=1):
+    if concurrency > 1:
+        batch_put_items_concurrent(dynamo, table_name, items, concurrency)
+        return
     sum = 0
     partitions = _partition(items)
     for partition in partitions:
@@ -39,3 +49,88 @@ def batch_put_items(dynamo, table_name, items):
         _batch_write(dynamo, batch)
         sum += len(partition)
         logger.debug(f'wrote batch of {len(partition)}, total written is {sum}')
+
+
+def batch_get_items(dynamo, table_name, keys, **params):
+    """
+    Batch-read items with input keys, 100 keys per request, retrying unprocessed keys with backoff.
+    Additional parameters such as ProjectionExpression apply to every request. Return list of found items.
+    """
+    found = []
+    for n in range(0, len(keys), DYNAMO_GET_CHUNK_SIZE):
+        bg = _backoff_generator()
+        request = {table_name: dict(params, Keys=keys[n:n + DYNAMO_GET_CHUNK_SIZE])}
+        while request:
+            response = dynamo.batch_get_item(RequestItems=request)
+            found.extend(response['Responses'].get(table_name, []))
+            request = response.get('UnprocessedKeys')
+            if request:
+                sleep = next(bg)
+                logger.debug(f'unprocessed keys, sleeping for {sleep} seconds')
+                time.sleep(sleep)
+    return found
+
+
+def _send_batch(dynamo, table_name, items):
+    """
+    Send a single batch write of items. Return list of items that were not processed.
+    A throttled request leaves all items unprocessed.
+    """
+    batch = {table_name: [{'PutRequest': {'Item': item}} for item in items]}
+    try:
+        response = dynamo.batch_write_item(RequestItems=batch)
+    except ClientError as e:
+        if e.response['Error']['Code'] in THROTTLE_ERROR_CODES:
+            return items
+        raise e
+    return [request['PutRequest']['Item'] for request in response['UnprocessedItems'].get(table_name, [])]
+
+
+def batch_put_items_concurrent(dynamo, table_name, items, max_concurrency):
+    """
+    Batch-write items keeping up to max_concurrency batches in flight on the shared client.
+    Unprocessed items are re-queued into later batches rather than retried in place.
+    The number of batches in flight adapts with additive increase after a window of clean batches
+    and multiplicative decrease whenever a batch comes back throttled or with unprocessed items.
+    """
+    start = time.perf_counter()
+    pending = deque(items)
+    in_flight = set()
+    limit = max(1, max_concurrency // 2)
+    successes = 0
+    retries = 0
+    throttles = 0
+    bg = _backoff_generator()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while pending or in_flight:
+            while pending and len(in_flight) < limit:
+                batch = [pending.popleft() for _ in range(min(DYNAMO_CHUNK_SIZE, len(pending)))]
+                in_flight.add(executor.submit(contextvars.copy_context().run, _send_batch, dynamo, table_name, batch))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            throttled = False
+            for future in done:
+                unprocessed = future.result()
+                if unprocessed:
+                    throttled = True
+                    pending.extend(unprocessed)
+                    retries += len(unprocessed)
+                    throttles += 1
+                    successes = 0
+                    limit = max(1, limit // 2)
+                    logger.debug(f'{len(unprocessed)} unprocessed items, concurrency is now {limit}')
+                else:
+                    bg = _backoff_generator()
+                    successes += 1
+                    if successes >= limit:
+                        successes = 0
+                        limit = min(max_concurrency, limit + 1)
+            if throttled and not in_flight:
+                sleep = next(bg)
+                logger.debug(f'throttled at minimum concurrency, sleeping for {sleep} seconds')
+                time.sleep(sleep)
+
+    elapsed = time.perf_counter() - start
+    rate = round(len(items) / elapsed) if elapsed else 0
+    logger.info(f'wrote {len(items)} items in {elapsed:.2f} seconds ({rate} items/sec), '
+                f'{retries} items retried after {throttles} throttles, final concurrency {limit}')
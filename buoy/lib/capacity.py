@@ -0,0 +1,179 @@
+import math
+import time
+import calendar
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+READ_OPERATIONS = ['query', 'scan', 'get_item', 'batch_get_item']
+WRITE_OPERATIONS = ['put_item', 'update_item', 'delete_item', 'batch_write_item', 'transact_write_items']
+
+# capacity charged for a request that fails without a ConsumedCapacity response, e.g. a failed condition check
+FAILED_REQUEST_UNITS = 1
+
+# estimates used for planning backfills
+ITEM_BYTES = 200
+HISTOGRAM_ITEM_BYTES = 4096
+
+
+class TokenBucket:
+    """
+    Token bucket holding a budget of capacity units per second. Callers wait for a non-negative balance
+    before a request and pay the actual consumed capacity after it, so the balance may briefly go into debt.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Block until the bucket balance is non-negative.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 0:
+                    return
+                wait = -self.tokens / self.rate
+            time.sleep(wait)
+
+    def consume(self, units):
+        with self.lock:
+            self._refill()
+            self.tokens -= units
+
+
+class LimitedClient:
+    """
+    DynamoDB client wrapper that holds reads and writes to a budget of read and write capacity units per second.
+    Every read and write operation requests ReturnConsumedCapacity and the reported units are paid
+    to the matching token bucket. Other client attributes pass through unchanged.
+    """
+
+    def __init__(self, client, read_units=None, write_units=None):
+        self.client = client
+        self.reads = TokenBucket(read_units) if read_units else None
+        self.writes = TokenBucket(write_units) if write_units else None
+        self.consumed = {'read': 0.0, 'write': 0.0}
+
+    def __getattr__(self, name):
+        fn = getattr(self.client, name)
+        if name in READ_OPERATIONS:
+            return self._limited(fn, self.reads, 'read')
+        if name in WRITE_OPERATIONS:
+            return self._limited(fn, self.writes, 'write')
+        return fn
+
+    def _limited(self, fn, bucket, kind):
+        def call(**kwargs):
+            kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+            if bucket:
+                bucket.acquire()
+            units = FAILED_REQUEST_UNITS
+            try:
+                response = fn(**kwargs)
+                units = consumed_units(response)
+                return response
+            finally:
+                self.consumed[kind] += units
+                if bucket:
+                    bucket.consume(units)
+        return call
+
+
+def consumed_units(response):
+    """
+    Sum capacity units reported in ConsumedCapacity of a response, which is a single entry or a list.
+    """
+    consumed = response.get('ConsumedCapacity')
+    if not consumed:
+        return 0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(entry.get('CapacityUnits', 0) for entry in consumed)
+
+
+def _month_hours(year, month, now):
+    """
+    Count hours of a calendar month that have passed by now, one observation each at most.
+    """
+    start = datetime.datetime(year, month, 1)
+    end = start + datetime.timedelta(days=calendar.monthrange(year, month)[1])
+    return max(0, int((min(end, now) - start).total_seconds() // 3600))
+
+
+def plan(periods, write_units, read_units, chunk_size, histograms=False, summary=False, now=None):
+    """
+    Estimate total capacity units and wall time of loading hourly observations of list of (year, month) periods,
+    month None for a whole year, at the given capacity budgets, with one Dynamo.write_stream call per period
+    writing chunks of chunk_size records. Records are counted from the calendar hours of each period up to now.
+    Follows the write path: every call reads the histogram marker (once, it is cached) and the summary item,
+    batch-writes items and month and day index items, and batch-reads and conditionally puts its year index item.
+    Only if histograms or summary are built on the table does it read the stored items of each chunk's range,
+    assumed empty as for periods not loaded yet. Only if histograms are built does it read and write the histogram
+    item of every month and day touched, and only if the summary is built does it update the summary item.
+    Returns dictionary of estimates and assumptions, with seconds None if there is no budget.
+    """
+    now = now or datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    records = 0
+    months = 0
+    days = 0
+    chunks = 0
+    writes = 0
+    for year, month in periods:
+        hours = [_month_hours(year, m, now) for m in (range(1, 13) if month is None else [month])]
+        records += sum(hours)
+        months += sum(1 for h in hours if h)
+        days += sum(math.ceil(h / 24) for h in hours)
+        chunks += math.ceil(sum(hours) / chunk_size)
+        writes += sum(hours) > 0
+    item_wcu = math.ceil(ITEM_BYTES / 1024)
+    item_rcu = math.ceil(ITEM_BYTES / 4096)
+    histogram_wcu = math.ceil(HISTOGRAM_ITEM_BYTES / 1024)
+    histogram_rcu = math.ceil(HISTOGRAM_ITEM_BYTES / 4096)
+
+    # items, eager month and day index items, and conditional year index items read consistently before the put
+    wcu = records * item_wcu + (months + days) * item_wcu + writes * item_wcu
+    rcu = item_rcu / 2 + len(periods) * item_rcu + writes * item_rcu
+    if histograms or summary:
+        rcu += chunks * item_rcu / 2
+    if histograms:
+        wcu += (months + days) * histogram_wcu
+        rcu += (months + days) * histogram_rcu
+    if summary:
+        wcu += writes * item_wcu
+
+    seconds = None
+    if write_units or read_units:
+        seconds = round(max(wcu / write_units if write_units else 0, rcu / read_units if read_units else 0))
+    return {
+        'records': records,
+        'wcu': round(wcu),
+        'rcu': round(rcu),
+        'seconds': seconds,
+        'histograms': histograms,
+        'summary': summary
+    }
+
+
+def describe_plan(estimate):
+    """
+    Describe estimate made by plan in one line, followed by a line of its assumptions.
+    """
+    seconds = 'unbounded time' if estimate['seconds'] is None else f'{estimate["seconds"]:,} seconds at the given budget'
+    built = [name for name in ['histograms', 'summary'] if estimate[name]]
+    aggregates = f'{" and ".join(built)} built' if built else 'histograms and summary not built'
+    return (f'estimated {estimate["records"]:,} records, {estimate["wcu"]:,} WCU, {estimate["rcu"]:,} RCU, {seconds}\n'
+            f'assuming one observation per hour, periods not loaded yet, {aggregates}, '
+            f'and every year index item increased')
@@ -0,0 +1,103 @@
+import io
+import datetime
+import threading
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+FIGURE_SIZE = (12, 5)
+
+# maximum number of points drawn, longer series are decimated to min-max pairs per bucket
+MAX_POINTS = 1000
+
+# series longer than this are drawn as a line without point markers
+MAX_MARKER_POINTS = 400
+
+# spans up to this long get an hourly minor and daily major axis, longer spans get automatic date ticks
+SHORT_SPAN = datetime.timedelta(days=7)
+
+FILE_NAME = 'waves.png'
+
+
+class Renderer:
+    """
+    Wave height chart renderer that keeps one figure, axes and line for its lifetime.
+    Each render replaces the line data, draws with the Agg canvas into an in-memory PNG buffer and then
+    drops the line data, so repeated renders in a warm container create no new matplotlib objects.
+    The figure is not registered with pyplot, so nothing outside the renderer holds on to it.
+    Renders are serialized, so one renderer may be shared by threads.
+    """
+
+    def __init__(self, tz, figsize=FIGURE_SIZE, max_points=MAX_POINTS):
+        self.tz = tz
+        self.max_points = max_points
+        self.lock = threading.Lock()
+        self.figure = Figure(figsize=figsize)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+        self.line, = self.axes.plot([], [], '-bo')
+        self.axes.grid(True)
+        self.axes.set(xlabel="Date", ylabel="Feet")
+        self.short_locators = (
+            mdates.HourLocator(interval=1, tz=tz),
+            mdates.DayLocator(interval=1, tz=tz),
+            mdates.DateFormatter("%m/%d", tz=tz))
+        auto = mdates.AutoDateLocator(tz=tz)
+        self.long_locators = (
+            mdates.AutoDateLocator(tz=tz, maxticks=40),
+            auto,
+            mdates.ConciseDateFormatter(auto, tz=tz))
+
+    def render(self, times, heights, title):
+        """
+        Render heights over times, in ascending time order, with title.
+        Return PNG in a bytes buffer with a file name, suitable as a Twitter media upload.
+        """
+        x, y = decimate(mdates.date2num(times), np.asarray(heights, dtype=float), self.max_points)
+        span = times[-1] - times[0] if times else datetime.timedelta()
+        minor, major, formatter = self.short_locators if span <= SHORT_SPAN else self.long_locators
+        buffer = io.BytesIO()
+        with self.lock:
+            self.line.set_data(x, y)
+            self.line.set_marker('o' if len(x) <= MAX_MARKER_POINTS else '')
+            self.axes.set_title(title)
+            self.axes.xaxis.set_minor_locator(minor)
+            self.axes.xaxis.set_major_locator(major)
+            self.axes.xaxis.set_major_formatter(formatter)
+            self.axes.relim()
+            self.axes.autoscale_view()
+            try:
+                self.canvas.print_png(buffer)
+            finally:
+                self.line.set_data([], [])
+        buffer.name = FILE_NAME
+        buffer.seek(0)
+        return buffer
+
+
+def decimate(x, y, max_points):
+    """
+    Reduce series to at most max_points points by keeping the minimum and maximum of equal-size buckets,
+    in time order. Peaks survive, so the chart looks the same at a fraction of the drawing cost.
+    """
+    if len(x) <= max_points:
+        return x, y
+    buckets = max_points // 2
+    edges = np.linspace(0, len(x), buckets + 1).astype(int)
+    indexes = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        segment = y[start:end]
+        low = start + int(np.nanargmin(segment)) if not np.isnan(segment).all() else start
+        high = start + int(np.nanargmax(segment)) if not np.isnan(segment).all() else end - 1
+        indexes.extend(sorted({low, high}))
+    return x[indexes], y[indexes]
+
+
+def window_title(days):
+    """
+    Chart title for a window of the given number of days.
+    """
+    if days >= 365:
+        return f"Significant Wave Height - Last {days // 365} Year{'s' if days >= 730 else ''}"
+    return f"Significant Wave Height - Last {days} Days"
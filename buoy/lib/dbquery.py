@@ -40,8 +40,9 @@ def collect_and_sort(fn_query, column):
 def percentile(fn_query, column, value):
     """
     Extract and sort float column values from queried items and calculate percentile of input value.
+    Result is (percentile, count at or below value, total count), or (0, 0, 0) if no items are queried.
     """
     values = collect_values(fn_query, column)
     cnt = sum([1 for v in values if v <= value])
-    per = int(cnt / len(values) * 100)
+    per = int(cnt / len(values) * 100) if values else 0
     return per, cnt, len(values)
@@ -1,62 +1,418 @@
 import logging
+import itertools
 from botocore.exceptions import ClientError
 from buoy.lib import dbquery
 from buoy.lib import batchput
+from buoy.lib import capacity
+from buoy.lib import histogram
+from buoy.lib import metrics
+from buoy.lib import parse
+from buoy.lib import querycache
+from buoy.lib import storage
+from buoy.lib import summary
+from buoy.lib.observation import Observation
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1000
 
-class Dynamo:
-    def __init__(self, client, table, buoy):
+
+# inline max index levels from coarsest to finest, as partition suffix and time key prefix length
+INDEX_YEAR = 'year'
+INDEX_YEAR_MONTH = 'yearmonth'
+INDEX_YEAR_MONTH_DAY = 'yearmonthday'
+INDEX_LEVELS = [(INDEX_YEAR, 4), (INDEX_YEAR_MONTH, 6), (INDEX_YEAR_MONTH_DAY, 8)]
+
+# loads cover whole months but not always whole years, so year items are only ever raised conditionally
+CONDITIONAL_INDEX_LEVELS = [INDEX_YEAR]
+
+# partition of the items marking index levels and histograms built from a full scan, keyed by level or HISTOGRAMS;
+# year-month items have been maintained since the table was created, so only the later levels need a marker
+MARKER = 'complete'
+MARKED_INDEX_LEVELS = [INDEX_YEAR, INDEX_YEAR_MONTH_DAY]
+HISTOGRAMS = 'histograms'
+
+# module level, so cached value lists survive warm Lambda invocations
+QUERY_CACHE = querycache.QueryCache()
+
+
+class Dynamo(storage.Storage):
+    def __init__(self, client, table, buoy, snapshot=None, concurrency=1, cache=None):
         self.client = client
         self.table = table
         self.buoy = buoy
+        self.snapshot = snapshot
+        self.concurrency = concurrency
+        self.cache = cache
+        self.marked = set()
 
+    @metrics.operation
     def write(self, records):
         """
-        Write list of record dictionaries as items into DynamoDB table.
+        Write list of observation records as items into DynamoDB table.
         Eagerly write inline index items into table as well.
         """
+        histograms, current = self._aggregates()
+        existing = self._find_existing(records) if histograms or current else {}
         self._write(records)
         self._write_index(records)
+        if histograms:
+            self._write_histograms(records, existing)
+        self._write_summary(current, summary.compute(records, existing))
 
+    @metrics.operation
     def write_conditional(self, records):
         """
-        Write list of record dictionaries as items into DynamoDB table.
+        Write list of observation records as items into DynamoDB table.
         Conditionally write inline index items into table as well.
         """
+        histograms, current = self._aggregates()
+        existing = self._find_existing(records) if histograms or current else {}
         self._write(records)
         self._write_index_conditional(records)
+        if histograms:
+            self._write_histograms(records, existing)
+        self._write_summary(current, summary.compute(records, existing))
+
+    @metrics.operation
+    def upsert(self, records):
+        """
+        Write list of observation records as items into DynamoDB table, skipping records whose items are
+        already stored with at least as much information. Conditionally write inline index items for
+        written records as well.
+        """
+        histograms, current = self._aggregates()
+        existing = self._find_existing(records)
+        changed = [record for record in records if self._has_more_info_than_existing(record, existing)]
+        logger.info(f'skipping {len(records) - len(changed)} of {len(records)} records already stored')
+        self._write(changed)
+        self._write_index_conditional(changed)
+        if histograms:
+            self._write_histograms(changed, existing)
+        self._write_summary(current, summary.compute(changed, existing))
+
+    def _aggregates(self):
+        """
+        Determine whether histograms are marked built and get the complete summary item, if any.
+        Stored items in the written range are read only if one of them is maintained, to compute
+        histogram deltas and the number of new records.
+        """
+        return self._marked(HISTOGRAMS), self.get_summary()
+
+    def aggregates_built(self):
+        """
+        Determine whether histograms and the summary item are built, so that writes maintain them.
+        """
+        histograms, current = self._aggregates()
+        return histograms, current is not None
 
+    def _has_more_info_than_existing(self, record, existing):
+        """
+        Determine whether observation record is new or has more information than its stored item,
+        applying parse.has_more_info_than to the stored form of both.
+        """
+        item = existing.get(record.time)
+        if not item:
+            return True
+        return parse.has_more_info_than(_item_observation(self._convert_item(record)), _item_observation(item))
+
+    @metrics.operation
+    def write_stream(self, records, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Write iterable of observation records as items into DynamoDB table, holding one chunk in memory at a time.
+        Eagerly write inline index items, histogram items and the summary item after all chunks are written.
+        """
+        histograms, current = self._aggregates()
+        index = {}
+        deltas = {}
+        totals = summary.empty()
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            existing = self._find_existing(chunk) if histograms or current else {}
+            self._write(chunk)
+            self._merge_index(index, chunk)
+            if histograms:
+                histogram.merge_deltas(deltas, histogram.compute_deltas(chunk, _wave_heights(existing)))
+            summary.merge(totals, summary.compute(chunk, existing))
+        items = [self._convert_index_item(level, key, record) for (level, key), record in index.items()]
+        logger.info(f'writing index of size {len(items)}')
+        self._write_index_items(items)
+        if histograms:
+            self._apply_histogram_deltas(deltas)
+        self._write_summary(current, totals)
+
+    @metrics.operation
     def _write(self, records):
         """
-        Write list of record dictionaries as items into DynamoDB table.
+        Write list of observation records as items into DynamoDB table.
         """
         items = self._convert_items(records)
         logger.info(f'converted {len(items)} items, batch-writing to dynamodb')
-        batchput.batch_put_items(self.client, self.table, items)
+        batchput.batch_put_items(self.client, self.table, items, self.concurrency)
 
     def _write_index(self, records):
         """
-        Eagerly write list of record dictionaries as inline index items into DynamoDB table.
+        Eagerly write list of observation records as inline index items into DynamoDB table.
         """
         items = self._convert_index_items(records)
         logger.info(f'writing index of size {len(items)}')
-        batchput.batch_put_items(self.client, self.table, items)
-        for item in items:
+        self._write_index_items(items)
+
+    @metrics.operation
+    def _write_index_items(self, items):
+        """
+        Eagerly write inline index items, except for levels that are only written conditionally.
+        """
+        conditional = [self._index_partition(level) for level in CONDITIONAL_INDEX_LEVELS]
+        eager = [item for item in items if item['id']['S'] not in conditional]
+        batchput.batch_put_items(self.client, self.table, eager, self.concurrency)
+        for item in eager:
             logger.debug(f'wrote index item: {item}')
+        self._write_index_items_conditional([item for item in items if item['id']['S'] in conditional])
 
     def _write_index_conditional(self, records):
         """
-        Conditionally write list of record dictionaries as inline index items into DynamoDB table.
+        Conditionally write list of observation records as inline index items into DynamoDB table.
         """
         items = self._convert_index_items(records)
         logger.info(f'conditionally writing index of size {len(items)}')
         self._write_index_items_conditional(items)
 
+    @metrics.operation
+    def _find_existing(self, records):
+        """
+        Find items already stored in the time range covered by list of observation records.
+        Result is a dictionary of time key to item with wave height, direction and period attributes.
+        """
+        if not records:
+            return {}
+        time_from = min(record.time for record in records)
+        time_to = max(record.time for record in records)
+        existing = {}
+        for item in dbquery.item_generator(lambda k: self._query_range_page(time_from, time_to, k)):
+            existing[item['time']['S']] = item
+        logger.info(f'found {len(existing)} existing items between {time_from} and {time_to}')
+        return existing
+
+    def _write_histograms(self, records, existing):
+        """
+        Apply wave height count changes of list of observation records to complete inline histogram items.
+        """
+        self._apply_histogram_deltas(histogram.compute_deltas(records, _wave_heights(existing)))
+
+    @metrics.operation
+    def _apply_histogram_deltas(self, deltas):
+        """
+        Apply dictionary of (partition, key) to bucket count deltas to inline histogram items.
+        Only histogram items built from a full scan by rebuild_histograms are updated. A histogram item is never
+        created from deltas, since it would count only the written records of a table loaded without it.
+        Writers call this only once rebuild_histograms has marked the histograms built, so a table without them
+        costs a single marker read per write.
+        """
+        updated = 0
+        for (partition, key), counts in deltas.items():
+            updated += self._update_histogram(partition, key, lambda c: histogram.apply_deltas(c, counts))
+        logger.info(f'updated {updated} of {len(deltas)} histogram items, skipped those not built yet')
+
+    def _update_histogram(self, partition, key, fn, create=False):
+        """
+        Read, modify and write complete inline histogram item using optimistic concurrency control on item version.
+        Input function maps prior bucket counts dictionary to new bucket counts dictionary.
+        An absent or incomplete item is skipped unless create is set. Return whether the item was written.
+        """
+        while True:
+            item = self._get_histogram(partition, key)
+            if not create and not _complete(item):
+                return False
+            version = int(item['version']['N']) if item else 0
+            counts = fn(histogram.counts_from_item(item) if item else {})
+            try:
+                self._put_histogram(partition, key, counts, version)
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    logger.debug(f'concurrent update of histogram item {partition} {key}, retrying')
+                else:
+                    raise e
+
+    def _get_histogram(self, partition, key):
+        """
+        Get inline histogram item with input partition suffix and key.
+        """
+        res = self.client.get_item(
+            TableName=self.table,
+            Key={
+                'id': {'S': f'{self.buoy}/{partition}'},
+                'time': {'S': key}
+            },
+            ConsistentRead=True
+        )
+        return res.get('Item')
+
+    def _put_histogram(self, partition, key, counts, version):
+        """
+        Write complete inline histogram item if stored item version still matches input version.
+        """
+        self.client.put_item(
+            TableName=self.table,
+            Item={
+                'id': {'S': f'{self.buoy}/{partition}'},
+                'time': {'S': key},
+                'counts': histogram.counts_to_attribute(counts),
+                'version': {'N': str(version + 1)},
+                'complete': {'BOOL': True}
+            },
+            ConditionExpression='attribute_not_exists(#time) OR #version = :version',
+            ExpressionAttributeNames={
+                '#time': 'time',
+                '#version': 'version'
+            },
+            ExpressionAttributeValues={
+                ':version': {'N': str(version)}
+            }
+        )
+        logger.debug(f'wrote histogram item {partition} {key} with {len(counts)} buckets at version {version + 1}')
+
+    @metrics.operation
+    def rebuild_histograms(self, records=None):
+        """
+        Recompute all inline histogram items from a full range scan over items, or from input iterable of
+        observation records holding the full history of the buoy, and mark them complete.
+        """
+        if records is None:
+            records = (_item_record(item) for item in self.query_items_after('0'))
+        deltas = {}
+        for record in records:
+            histogram.add_deltas(deltas, record.time, histogram.bucket_of(record.wave_height), 1)
+        logger.info(f'rebuilding {len(deltas)} histogram items')
+        for (partition, key), counts in deltas.items():
+            self._update_histogram(partition, key, lambda c: counts, create=True)
+        self._mark(HISTOGRAMS)
+
+    @metrics.operation
+    def _write_summary(self, current, changes):
+        """
+        Apply summary of written records to inline summary item, whose complete state current was read before
+        the write. The record count is added unconditionally.
+        Earliest time, latest item and max item are each set with a conditional update, and only if the
+        stored summary shows that they improve, so most writes issue a single ADD.
+        Only a summary item built from a full scan by rebuild_summary is updated. The summary item is never created
+        from written records, since it would cover only those records on a table loaded without it.
+        """
+        if not changes['latest']:
+            return
+        if not current:
+            logger.info('skipping summary update, summary not built yet')
+            return
+        if changes['count']:
+            self._update_summary('ADD #count :count', {'#count': 'count'}, {':count': {'N': str(changes['count'])}})
+        if not current['first'] or changes['first'].time < current['first']:
+            self._update_summary(
+                'SET #first = :time',
+                {'#first': 'firsttime'},
+                {':time': {'S': changes['first'].time}},
+                'attribute_not_exists(#first) OR #first > :time')
+        if not current['latest'] or changes['latest'].time > current['latest']['time']['S']:
+            self._update_summary(
+                'SET #latest = :item',
+                {'#latest': 'latestitem', '#time': 'time'},
+                {':item': {'M': self._convert_item(changes['latest'])}, ':time': {'S': changes['latest'].time}},
+                'attribute_not_exists(#latest) OR #latest.#time < :time')
+        if not current['max'] or changes['max'].wave_height > float(current['max']['waveheight']['N']):
+            self._update_summary(
+                'SET #max = :item',
+                {'#max': 'maxitem'},
+                {':item': {'M': self._convert_item(changes['max'])},
+                 ':waveheight': {'N': str(changes['max'].wave_height)}},
+                'attribute_not_exists(#max) OR #max.waveheight < :waveheight')
+        logger.info(f'updated summary with {changes["count"]} new records')
+
+    def _update_summary(self, expression, names, values, condition=None):
+        """
+        Update complete inline summary item, ignoring condition check failures.
+        """
+        params = {
+            'TableName': self.table,
+            'Key': self._summary_key(),
+            'UpdateExpression': expression,
+            'ExpressionAttributeNames': dict(names, **{'#complete': 'complete'}),
+            'ExpressionAttributeValues': values,
+            'ConditionExpression': 'attribute_exists(#complete)'
+        }
+        if condition:
+            params['ConditionExpression'] += f' AND ({condition})'
+        try:
+            self.client.update_item(**params)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                logger.debug(f'did not update summary due to condition check failure: {expression}')
+            else:
+                raise e
+
+    def _summary_key(self):
+        return {
+            'id': {'S': f'{self.buoy}/{summary.SUMMARY}'},
+            'time': {'S': summary.SUMMARY}
+        }
+
+    def get_summary(self):
+        """
+        Get inline summary item as a dictionary with record count, earliest time key, latest item and max item,
+        or None if the summary item is absent or was not built from a full scan.
+        """
+        res = self.client.get_item(TableName=self.table, Key=self._summary_key(), ConsistentRead=True)
+        item = res.get('Item')
+        if not _complete(item):
+            return
+        return {
+            'count': int(item['count']['N']) if 'count' in item else 0,
+            'first': item['firsttime']['S'] if 'firsttime' in item else None,
+            'latest': item['latestitem']['M'] if 'latestitem' in item else None,
+            'max': item['maxitem']['M'] if 'maxitem' in item else None
+        }
+
+    @metrics.operation
+    def rebuild_summary(self, records=None):
+        """
+        Recompute inline summary item from a full range scan over items, or from input iterable of
+        observation records holding the full history of the buoy, and mark it complete.
+        """
+        if records is None:
+            records = (_item_record(item) for item in self.query_items_after('0'))
+        totals = summary.compute(records, ())
+        if not totals['latest']:
+            return
+        item = self._summary_key()
+        item['count'] = {'N': str(totals['count'])}
+        item['firsttime'] = {'S': totals['first'].time}
+        item['latestitem'] = {'M': self._convert_item(totals['latest'])}
+        item['maxitem'] = {'M': self._convert_item(totals['max'])}
+        item['complete'] = {'BOOL': True}
+        self.client.put_item(TableName=self.table, Item=item)
+        logger.info(f'rebuilt summary of {totals["count"]} records')
+
+    @metrics.operation
+    def rebuild_index(self, records=None):
+        """
+        Recompute all inline max index items at every level from a full range scan over items, or from input
+        iterable of observation records holding the full history of the buoy, and mark the levels built.
+        """
+        if records is None:
+            records = (_item_record(item) for item in self.query_items_after('0'))
+        index = {}
+        self._merge_index(index, records)
+        items = [self._convert_index_item(level, key, record) for (level, key), record in index.items()]
+        logger.info(f'rebuilding {len(items)} index items')
+        batchput.batch_put_items(self.client, self.table, items, self.concurrency)
+        for level in MARKED_INDEX_LEVELS:
+            self._mark(level)
+
     def _convert_items(self, records):
         """
-        Convert list of record dictionaries to list of DyanmoDB item dictionaries.
+        Convert list of observation records to list of DyanmoDB item dictionaries.
         """
         items = []
         for n, record in enumerate(records):
@@ -68,58 +424,92 @@ class Dynamo:
 
     def _convert_item(self, record):
         """
-        Make Dynamo DB table item dictionary from record dictionary. See parse.py for record specification.
+        Make Dynamo DB table item dictionary from observation record. See observation.py for record specification.
         """
         item = {
             'id': {'S': self.buoy},
-            'time': {'S': record['time']},
-            'year': {'N': str(record['year'])},
-            'month': {'N': str(record['month'])},
-            'day': {'N': str(record['day'])},
-            'hour': {'N': str(record['hour'])},
-            'minute': {'N': str(record['minute'])},
-            'monthday': {'S': record['month_day']},
-            'yearmonth': {'S': record['year_month']},
-            'waveheight': {'N': str(record['wave_height'])}
+            'time': {'S': record.time},
+            'year': {'N': str(record.year)},
+            'month': {'N': str(record.month)},
+            'day': {'N': str(record.day)},
+            'hour': {'N': str(record.hour)},
+            'minute': {'N': str(record.minute)},
+            'monthday': {'S': record.month_day},
+            'yearmonth': {'S': record.year_month},
+            'waveheight': {'N': str(record.wave_height)}
         }
-        if record['wave_direction']:
-            item['wavedir'] = {'N': str(record['wave_direction'])}
-        if record['dominant_period']:
-            item['domperiod'] = {'N': str(record['dominant_period'])}
-        if record['average_period']:
-            item['avgperiod'] = {'N': str(record['average_period'])}
+        if record.wave_direction:
+            item['wavedir'] = {'N': str(record.wave_direction)}
+        if record.dominant_period:
+            item['domperiod'] = {'N': str(record.dominant_period)}
+        if record.average_period:
+            item['avgperiod'] = {'N': str(record.average_period)}
         return item
 
     def _convert_index_items(self, records):
         """
-        Converts list of record dictionaries to list of inline index items.
+        Converts list of observation records to list of inline index items.
         """
         index = {}
+        self._merge_index(index, records)
+        return [self._convert_index_item(level, key, record) for (level, key), record in index.items()]
+
+    def _merge_index(self, index, records):
+        """
+        Merge iterable of observation records into dictionary of (index level, time key prefix) to record
+        with maximum wave height, for every index level.
+        """
         for record in records:
-            ym = record['year_month']
-            if ym not in index or record['wave_height'] > index[ym]['wave_height']:
-                index[ym] = record
-        return [self._convert_index_item(record) for record in index.values()]
+            for level, length in INDEX_LEVELS:
+                key = (level, record.time[:length])
+                if key not in index or record.wave_height > index[key].wave_height:
+                    index[key] = record
+
+    def _index_partition(self, level):
+        return f'{self.buoy}/{level}'
 
-    def _convert_index_item(self, record):
+    def _convert_index_item(self, level, key, record):
         """
-        Make DynamoDB table item for inline year-month wave-height index.
+        Make DynamoDB table item for inline wave-height index at input level with input time key prefix.
         """
         item = self._convert_item(record)
-        item['id'] = {'S': f'{self.buoy}/yearmonth'}
-        item['time'] = {'S': record['year_month']}
+        item['id'] = {'S': self._index_partition(level)}
+        item['time'] = {'S': key}
         return item
 
+    @metrics.operation
     def _write_index_items_conditional(self, items):
         """
-        Conditionally write inline index items.
+        Conditionally write inline index items. Existing index items are batch-read and compared locally,
+        and only items that increase the stored wave height are written, each with a conditional put that keeps
+        the comparison safe against concurrent updates at 1 WCU per item, half the cost of a transactional write.
         """
-        for item in items:
-            self._write_index_item_conditional(item)
+        existing = self._batch_get_index_wave_heights(items)
+        increasing = [item for item in items if _index_key(item) not in existing
+                      or existing[_index_key(item)] < float(item['waveheight']['N'])]
+        written = sum(self._write_index_item_conditional(item) for item in increasing)
+        logger.info(f'wrote {written} of {len(items)} index items, avoided {len(items) - len(increasing)} writes '
+                    f'by comparing with stored items, {len(increasing) - written} lost to concurrent updates')
+
+    def _batch_get_index_wave_heights(self, items):
+        """
+        Batch-read inline index items with the keys of input items.
+        Result is a dictionary of (partition, time key) to wave height.
+        """
+        keys = [{'id': item['id'], 'time': item['time']} for item in items]
+        found = batchput.batch_get_items(
+            self.client,
+            self.table,
+            keys,
+            ProjectionExpression='#id, #time, waveheight',
+            ExpressionAttributeNames={'#id': 'id', '#time': 'time'},
+            ConsistentRead=True)
+        return {_index_key(item): float(item['waveheight']['N']) for item in found}
 
     def _write_index_item_conditional(self, item):
         """
         Conditionally write inline index item if item not already present or if prior item has smaller wave height.
+        Return whether the item was written.
         """
         try:
             self.client.put_item(
@@ -135,41 +525,132 @@ class Dynamo:
                 }
             )
             logger.debug(f'wrote index item: {item}')
+            return True
         except ClientError as e:
             if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
                 logger.debug(f'did not write index item due to condition check failure: {item}')
+                return False
             else:
                 raise e
 
+    @metrics.operation
     def find_max_wave_height(self):
         """
-        Find the maximum wave height ever recorded by scanning through inline index records.
+        Find the maximum wave height ever recorded. Use inline summary item if present, otherwise scan through
+        inline year index records, or year-month index records if the year index is not marked built.
+        Answer from snapshot instead if present.
+        """
+        if self.snapshot:
+            return self.snapshot.find_max_wave_height()
+        current = self.get_summary()
+        if current and current['max']:
+            return current['max']
+        level = INDEX_YEAR if self._index_built(INDEX_YEAR) else INDEX_YEAR_MONTH
+        return _max_item(dbquery.item_generator(lambda k: self._query_index_page(level, start_key=k)))
+
+    @metrics.operation
+    def find_max_since(self, time):
         """
-        max_item = None
-        for item in dbquery.item_generator(self._query_index_page):
-            if not max_item or float(item['waveheight']['N']) > float(max_item['waveheight']['N']):
-                max_item = item
-        return max_item
+        Find the item with maximum wave height at or after input time key of the form YYYYMMDD or YYYYMMDDHH.
+        The range is covered by the items of the remainder of the first day, the day index items of the
+        remainder of its month, the month index items of the remainder of its year and the later year index items,
+        so at most a few dozen items are read whatever the range. The result is an index item unless the maximum
+        falls on the first day. If the day index is not marked built, the items of the remainder of the month are read
+        instead, and if the year index is not marked built, the month index items of later years.
+        """
+        day, month, year = time[:8], time[:6], time[:4]
+        if self._index_built(INDEX_YEAR_MONTH_DAY):
+            days = itertools.chain(
+                dbquery.item_generator(lambda k: self._query_prefix_page(self.buoy, time, day, k)),
+                self._query_index_after(INDEX_YEAR_MONTH_DAY, day, month))
+        else:
+            days = dbquery.item_generator(lambda k: self._query_prefix_page(self.buoy, time, month, k))
+        if self._index_built(INDEX_YEAR):
+            years = self._query_index_after(INDEX_YEAR, year, '')
+        else:
+            # '~' sorts after every digit, so this starts after the last month of the year
+            years = self._query_index_after(INDEX_YEAR_MONTH, f'{year}~', '')
+        return _max_item(itertools.chain(days, self._query_index_after(INDEX_YEAR_MONTH, month, year), years))
+
+    def _index_built(self, level):
+        """
+        Determine whether index level holds items built from a full scan by rebuild_index. Writes to a table loaded
+        before the level existed create its items from the written records alone, so they are not trusted until then.
+        """
+        return level not in MARKED_INDEX_LEVELS or self._marked(level)
+
+    def _marker_key(self, name):
+        return {
+            'id': {'S': f'{self.buoy}/{MARKER}'},
+            'time': {'S': name}
+        }
 
+    def _mark(self, name):
+        """
+        Put marker item recording that index level or histograms of input name were built from a full scan.
+        """
+        self.client.put_item(TableName=self.table, Item=dict(self._marker_key(name), complete={'BOOL': True}))
+        self.marked.add(name)
+
+    def _marked(self, name):
+        """
+        Determine whether marker item of input name is present. Markers are never removed, so a present marker
+        is remembered and not read again.
+        """
+        if name in self.marked:
+            return True
+        res = self.client.get_item(TableName=self.table, Key=self._marker_key(name))
+        if not _complete(res.get('Item')):
+            return False
+        self.marked.add(name)
+        return True
+
+    def _query_index_after(self, level, key, prefix):
+        """
+        Generate index items at input level with time key greater than input key and beginning with input prefix.
+        """
+        items = dbquery.item_generator(lambda k: self._query_prefix_page(self._index_partition(level), key, prefix, k))
+        return (item for item in items if item['time']['S'] != key)
+
+    @metrics.operation
     def find_last_occurrence_of(self, wave_height):
         """
         Find the most recent occurrence of a wave height greater than the input wave height.
+        Descend inline index levels, finding the most recent year, then month within that year, then day within
+        that month with a greater maximum, and finally the most recent item within that day.
+        Start at the year-month level if the year index is not marked built, and stop descending at the
+        year-month level if the day index is not marked built.
+        Answer from snapshot instead if present.
         """
-        index_item = dbquery.first_item(lambda k: self._query_index_page(wave_height, k))
-        if not index_item:
+        if self.snapshot:
+            return self.snapshot.find_last_occurrence_of(wave_height)
+        prefix = None
+        for level, _ in INDEX_LEVELS:
+            if not self._index_built(level):
+                if prefix:
+                    break
+                continue
+            index_item = dbquery.first_item(lambda k: self._query_index_page(level, wave_height, prefix, k))
+            if not index_item:
+                break
+            prefix = index_item['time']['S']
+        if not prefix:
             return
 
-        year_month = index_item['time']['S']
-        item = dbquery.first_item(lambda k: self._query_items_page(wave_height, year_month, k))
+        item = dbquery.first_item(lambda k: self._query_items_page(wave_height, prefix, k))
         if item:
             return item
 
-        logger.warning(f'located index item but failed to locate individual record for year-month {year_month}')
+        logger.warning(f'located index item but failed to locate individual record for period {prefix}')
 
+    @metrics.operation
     def find_latest(self):
         """
-        Find the most recent item in the database.
+        Find the most recent item in the database. Use inline summary item if present.
         """
+        current = self.get_summary()
+        if current and current['latest']:
+            return current['latest']
         res = self._query_latest()
         if res['Items']:
             return res['Items'][0]
@@ -193,9 +674,10 @@ class Dynamo:
             }
         )
 
-    def _query_index_page(self, wave_height=None, start_key=None):
+    def _query_index_page(self, level, wave_height=None, prefix=None, start_key=None):
         """
-        Query page of wave height records using inline index.
+        Query page of wave height records using inline index at input level, most recent first,
+        optionally restricted to time keys beginning with input prefix.
         """
         params = {
             'TableName': self.table,
@@ -206,11 +688,18 @@ class Dynamo:
             },
             'ExpressionAttributeValues': {
                 ':id': {
-                    'S': f'{self.buoy}/yearmonth'
+                    'S': self._index_partition(level)
                 }
             }
         }
 
+        if prefix:
+            params['KeyConditionExpression'] = '#id = :id AND begins_with(#time, :prefix)'
+            params['ExpressionAttributeNames']['#time'] = 'time'
+            params['ExpressionAttributeValues'][':prefix'] = {
+                'S': prefix
+            }
+
         if wave_height:
             params['FilterExpression'] = 'waveheight > :waveheight'
             params['ExpressionAttributeValues'][':waveheight'] = {
@@ -222,15 +711,15 @@ class Dynamo:
 
         return self.client.query(**params)
 
-    def _query_items_page(self, wave_height, year_month, start_key=None):
+    def _query_items_page(self, wave_height, prefix, start_key=None):
         """
-        Query page of items with input year-month and with wave height greater than input wave height.
+        Query page of items with time key beginning with input prefix and with wave height greater than input wave height.
         """
         params = {
             'TableName': self.table,
             'ScanIndexForward': False,
             'FilterExpression': 'waveheight > :waveheight',
-            'KeyConditionExpression': '#id = :id AND begins_with(#time, :yearmonth)',
+            'KeyConditionExpression': '#id = :id AND begins_with(#time, :prefix)',
             'ExpressionAttributeNames': {
                 '#id': 'id',
                 '#time': 'time'
@@ -239,8 +728,8 @@ class Dynamo:
                 ':id': {
                     'S': f'{self.buoy}'
                 },
-                ':yearmonth': {
-                    'S': year_month
+                ':prefix': {
+                    'S': prefix
                 },
                 ':waveheight': {
                     'N': str(wave_height)
@@ -253,30 +742,192 @@ class Dynamo:
 
         return self.client.query(**params)
 
+    def query_index_items(self, level):
+        """
+        Generate all inline index items at input level, most recent first.
+        """
+        return dbquery.item_generator(lambda k: self._query_index_page(level, start_key=k))
+
+    def query_items_after(self, time):
+        """
+        Generate all items with time key greater than input time key in ascending order.
+        """
+        return dbquery.item_generator(lambda k: self._query_after_page(time, k))
+
+    def _query_after_page(self, time, start_key=None):
+        """
+        Query page of items with time key greater than input time key.
+        """
+        params = {
+            'TableName': self.table,
+            'ProjectionExpression': '#time, #minute, waveheight, wavedir, domperiod, avgperiod',
+            'KeyConditionExpression': '#id = :id AND #time > :time',
+            'ExpressionAttributeNames': {
+                '#id': 'id',
+                '#time': 'time',
+                '#minute': 'minute'
+            },
+            'ReturnConsumedCapacity': 'TOTAL',
+            'ExpressionAttributeValues': {
+                ':id': {
+                    'S': f'{self.buoy}'
+                },
+                ':time': {
+                    'S': time
+                }
+            }
+        }
+
+        if start_key:
+            params['ExclusiveStartKey'] = start_key
+
+        return self.client.query(**params)
+
+    def _query_prefix_page(self, partition, time_from, prefix, start_key=None):
+        """
+        Query page of items in input partition with time key at or after input time key and beginning with input prefix.
+        """
+        params = {
+            'TableName': self.table,
+            'KeyConditionExpression': '#id = :id AND #time BETWEEN :from AND :to',
+            'ExpressionAttributeNames': {
+                '#id': 'id',
+                '#time': 'time'
+            },
+            'ExpressionAttributeValues': {
+                ':id': {
+                    'S': partition
+                },
+                ':from': {
+                    'S': time_from
+                },
+                ':to': {
+                    'S': f'{prefix}~'
+                }
+            }
+        }
+
+        if start_key:
+            params['ExclusiveStartKey'] = start_key
+
+        return self.client.query(**params)
+
+    def _query_range_page(self, time_from, time_to, start_key=None):
+        """
+        Query page of items with time key in input range, inclusive.
+        """
+        params = {
+            'TableName': self.table,
+            'ProjectionExpression': '#time, waveheight, wavedir, domperiod, avgperiod',
+            'KeyConditionExpression': '#id = :id AND #time BETWEEN :from AND :to',
+            'ExpressionAttributeNames': {
+                '#id': 'id',
+                '#time': 'time'
+            },
+            'ExpressionAttributeValues': {
+                ':id': {
+                    'S': f'{self.buoy}'
+                },
+                ':from': {
+                    'S': time_from
+                },
+                ':to': {
+                    'S': time_to
+                }
+            }
+        }
+
+        if start_key:
+            params['ExclusiveStartKey'] = start_key
+
+        return self.client.query(**params)
+
+    @metrics.operation
     def query_month_day(self, month_day):
         """
         Obtain all wave height values for a given month-day and return in sorted list ascending.
         """
+        if self.cache:
+            return self._cached_month_day(month_day, list)
         return dbquery.collect_and_sort(lambda k: self._query_month_day_page(month_day, k), 'waveheight')
 
+    @metrics.operation
     def query_month_day_percentile(self, month_day, wave_height):
         """
-        Obtain all wave height values for a given month-day and calculate percentile of input value.
+        Calculate percentile of input value among wave heights for a given month-day.
+        Use snapshot or complete inline histogram item if present, otherwise obtain all wave height values.
         """
+        if self.snapshot:
+            return self.snapshot.month_day_percentile(month_day, wave_height)
+        item = self._get_histogram(histogram.HISTOGRAM_MONTH_DAY, month_day)
+        if _complete(item):
+            return histogram.percentile(histogram.counts_from_item(item), wave_height)
+        if self.cache:
+            return self._cached_month_day(month_day, lambda values: querycache.percentile(values, wave_height))
         return dbquery.percentile(lambda k: self._query_month_day_page(month_day, k), 'waveheight', wave_height)
 
+    @metrics.operation
     def query_month(self, month):
         """
         Obtain all wave height values for a given month and return in sorted list ascending.
         """
+        if self.cache:
+            return self._cached_month(month, list)
         return dbquery.collect_and_sort(lambda k: self._query_month_page(month, k), 'waveheight')
 
+    @metrics.operation
     def query_month_percentile(self, month, wave_height):
         """
-        Obtain all wave height values for a given month and calculate percentile of input value.
+        Calculate percentile of input value among wave heights for a given month.
+        Use snapshot or complete inline histogram item if present, otherwise obtain all wave height values.
         """
+        if self.snapshot:
+            return self.snapshot.month_percentile(month, wave_height)
+        item = self._get_histogram(histogram.HISTOGRAM_MONTH, f'{month:02d}')
+        if _complete(item):
+            return histogram.percentile(histogram.counts_from_item(item), wave_height)
+        if self.cache:
+            return self._cached_month(month, lambda values: querycache.percentile(values, wave_height))
         return dbquery.percentile(lambda k: self._query_month_page(month, k), 'waveheight', wave_height)
 
+    def _cached_month(self, month, fn):
+        key = f'{month:02d}'
+        return self._cached('month', key, lambda k: self._query_month_page(month, k), lambda t: t[4:6] == key, fn)
+
+    def _cached_month_day(self, month_day, fn):
+        return self._cached(
+            'monthday', month_day, lambda k: self._query_month_day_page(month_day, k), lambda t: t[4:8] == month_day, fn)
+
+    def _cached(self, kind, key, fn_query, matches, fn):
+        """
+        Apply function to sorted wave heights from query cache. A miss finds the latest time key of the buoy,
+        which becomes the watermark, and runs the paginated query for items up to it.
+        A hit reads only items of the buoy newer than the cached watermark and keeps those with a time key that matches,
+        so a refresh reads the few items written since, whether or not they match.
+        """
+        def load():
+            latest = self.find_latest()
+            watermark = latest['time']['S'] if latest else ''
+            pairs = ((item['time']['S'], float(item['waveheight']['N'])) for item in dbquery.item_generator(fn_query))
+            return watermark, (pair for pair in pairs if pair[0] <= watermark)
+
+        def refresh(watermark):
+            units = []
+
+            def fn_page(start_key):
+                res = self._query_after_page(watermark, start_key)
+                units.append(capacity.consumed_units(res))
+                return res
+
+            items = list(dbquery.item_generator(fn_page))
+            logger.info(f'query cache refresh of {kind} {key} read {len(items)} items after {watermark}, '
+                        f'consumed {sum(units)} read capacity units')
+            latest = items[-1]['time']['S'] if items else watermark
+            return latest, ((item['time']['S'], float(item['waveheight']['N'])) for item in items
+                            if matches(item['time']['S']))
+
+        return self.cache.get((self.table, self.buoy, kind, key), load, refresh, fn)
+
     def _query_month_day_page(self, month_day, start_key=None):
         """
         Query page of items from month-day index.
@@ -284,10 +935,11 @@ class Dynamo:
         params = {
             'TableName': self.table,
             'IndexName': 'id-monthday',
-            'ProjectionExpression': 'waveheight',
+            'ProjectionExpression': '#time, waveheight',
             'KeyConditionExpression': '#id = :id AND #monthday = :monthday',
             'ExpressionAttributeNames': {
                 '#id': 'id',
+                '#time': 'time',
                 '#monthday': 'monthday'
             },
             'ReturnConsumedCapacity': 'TOTAL',
@@ -313,10 +965,11 @@ class Dynamo:
         params = {
             'TableName': self.table,
             'IndexName': 'id-month',
-            'ProjectionExpression': 'waveheight',
+            'ProjectionExpression': '#time, waveheight',
             'KeyConditionExpression': '#id = :id AND #month = :month',
             'ExpressionAttributeNames': {
                 '#id': 'id',
+                '#time': 'time',
                 '#month': 'month'
             },
             'ReturnConsumedCapacity': 'TOTAL',
@@ -334,3 +987,55 @@ class Dynamo:
             params['ExclusiveStartKey'] = start_key
 
         return self.client.query(**params)
+
+
+def _wave_heights(existing):
+    """
+    Map dictionary of time key to item to dictionary of time key to wave height.
+    """
+    return {time: float(item['waveheight']['N']) for time, item in existing.items()}
+
+
+def _complete(item):
+    """
+    Determine whether inline histogram, summary or marker item is present and was built from a full scan.
+    """
+    return bool(item) and item.get('complete', {}).get('BOOL', False)
+
+
+def _index_key(item):
+    return item['id']['S'], item['time']['S']
+
+
+def _max_item(items):
+    """
+    Find item with maximum wave height in iterable of items, or None if empty.
+    """
+    max_item = None
+    for item in items:
+        if not max_item or float(item['waveheight']['N']) > float(max_item['waveheight']['N']):
+            max_item = item
+    return max_item
+
+
+def _item_record(item):
+    """
+    Make observation record with time keys from a DynamoDB table item with time key, minute and wave attributes.
+    """
+    time = item['time']['S']
+    wave = _item_observation(item)
+    record = Observation(int(time[:4]), int(time[4:6]), int(time[6:8]), int(time[8:10]), int(item['minute']['N']),
+                         wave.wave_height, wave.wave_direction, wave.dominant_period, wave.average_period)
+    parse.add_time_keys(record)
+    return record
+
+
+def _item_observation(item):
+    """
+    Make observation record holding the wave attributes of a DynamoDB table item.
+    """
+    def value(name):
+        return float(item[name]['N']) if name in item else None
+
+    return Observation(None, None, None, None, None,
+                       value('waveheight'), value('wavedir'), value('domperiod'), value('avgperiod'))
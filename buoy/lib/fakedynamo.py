@@ -0,0 +1,878 @@
+import re
+import math
+import time
+import random
+import bisect
+import logging
+import threading
+from decimal import Decimal
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+PAGE_BYTES = 1024 * 1024
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+TRANSACT_LIMIT = 100
+
+TOKEN = re.compile(r'\s*(?:(?P<name>#\w+)|(?P<value>:\w+)|(?P<op><>|<=|>=|[=<>(),.+-])|(?P<word>[A-Za-z_]\w*))')
+KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'ADD', 'REMOVE', 'DELETE'}
+FUNCTIONS = {'attribute_exists', 'attribute_not_exists', 'begins_with', 'contains', 'size', 'if_not_exists'}
+
+
+def create_buoy_table(client, table):
+    """
+    Create table with the key schema and local secondary indexes used by this project. See README.md.
+    """
+    client.create_table(
+        TableName=table,
+        KeySchema=[
+            {'AttributeName': 'id', 'KeyType': 'HASH'},
+            {'AttributeName': 'time', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'id', 'AttributeType': 'S'},
+            {'AttributeName': 'time', 'AttributeType': 'S'},
+            {'AttributeName': 'month', 'AttributeType': 'N'},
+            {'AttributeName': 'monthday', 'AttributeType': 'S'}
+        ],
+        LocalSecondaryIndexes=[{
+            'IndexName': f'id-{name}',
+            'KeySchema': [
+                {'AttributeName': 'id', 'KeyType': 'HASH'},
+                {'AttributeName': name, 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['waveheight']}
+        } for name in ['month', 'monthday']])
+
+
+class FakeDynamo:
+    """
+    In-memory stand-in for the boto3 DynamoDB client, covering the calls made by this project:
+    create_table, get_item, put_item, update_item, query, batch_write_item, batch_get_item and transact_write_items.
+    Key condition, filter, condition, update and projection expressions are parsed and evaluated.
+    Queries honor local secondary indexes, ScanIndexForward, Limit, ExclusiveStartKey and the 1 MB page limit.
+    Consumed capacity is computed from item sizes as DynamoDB does and reported when requested.
+    A fraction of batch writes and reads, given by unprocessed_rate, leaves the second half of its requests
+    unprocessed, and a fraction of batch writes, given by throttle_rate, fails with a throttling error. Every call sleeps for latency seconds.
+    Counters of calls, pages, items and capacity units are kept in stats.
+    """
+
+    def __init__(self, latency=0, unprocessed_rate=0, throttle_rate=0, seed=None):
+        self.latency = latency
+        self.unprocessed_rate = unprocessed_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.tables = {}
+        self.lock = threading.RLock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'calls': {}, 'pages': 0, 'items_read': 0, 'items_written': 0, 'unprocessed': 0,
+                      'read_units': 0.0, 'write_units': 0.0}
+
+    def _call(self, operation):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.stats['calls'][operation] = self.stats['calls'].get(operation, 0) + 1
+
+    def _charge(self, read_units=0.0, write_units=0.0):
+        with self.lock:
+            self.stats['read_units'] += read_units
+            self.stats['write_units'] += write_units
+
+    def _table(self, name):
+        if name not in self.tables:
+            raise _error('ResourceNotFoundException', f'Requested resource not found: Table: {name} not found')
+        return self.tables[name]
+
+    def create_table(self, TableName, KeySchema, AttributeDefinitions, LocalSecondaryIndexes=(), **kwargs):
+        self._call('create_table')
+        with self.lock:
+            if TableName in self.tables:
+                raise _error('ResourceInUseException', f'Table already exists: {TableName}')
+            self.tables[TableName] = _Table(KeySchema, LocalSecondaryIndexes)
+        return {'TableDescription': {'TableName': TableName, 'TableStatus': 'ACTIVE'}}
+
+    def get_item(self, TableName, Key, ConsistentRead=False, ProjectionExpression=None,
+                 ExpressionAttributeNames=None, ReturnConsumedCapacity='NONE'):
+        self._call('get_item')
+        with self.lock:
+            table = self._table(TableName)
+            item = table.get(Key)
+            units = _read_units(table.size(item) if item else 0, ConsistentRead)
+            self.stats['items_read'] += 1 if item else 0
+        self._charge(read_units=units)
+        response = {}
+        if item:
+            response['Item'] = _project(item, ProjectionExpression, ExpressionAttributeNames)
+        return _with_capacity(response, TableName, units, ReturnConsumedCapacity)
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnConsumedCapacity='NONE'):
+        self._call('put_item')
+        with self.lock:
+            table = self._table(TableName)
+            old = table.get(Item)
+            units = _write_units(max(table.size(old) if old else 0, _item_size(Item)))
+            self._charge(write_units=units)
+            _check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues)
+            table.put(Item)
+            self.stats['items_written'] += 1
+        return _with_capacity({}, TableName, units, ReturnConsumedCapacity)
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', ReturnConsumedCapacity='NONE'):
+        self._call('update_item')
+        with self.lock:
+            table = self._table(TableName)
+            old = table.get(Key)
+            _check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues)
+            item = _update(old, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            units = _write_units(max(table.size(old) if old else 0, _item_size(item)))
+            self._charge(write_units=units)
+            table.put(item)
+            self.stats['items_written'] += 1
+        response = {'Attributes': item} if ReturnValues == 'ALL_NEW' else {}
+        return _with_capacity(response, TableName, units, ReturnConsumedCapacity)
+
+    def query(self, TableName, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+              ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, ConsistentRead=False,
+              ReturnConsumedCapacity='NONE', Select=None):
+        self._call('query')
+        names, values = ExpressionAttributeNames, ExpressionAttributeValues
+        key_condition = _parse_condition(KeyConditionExpression)
+        filter_condition = _parse_condition(FilterExpression) if FilterExpression else None
+        with self.lock:
+            table = self._table(TableName)
+            index = table.index(IndexName)
+            items, scanned, size, last = index.query(key_condition, names, values, ScanIndexForward, Limit,
+                                                     ExclusiveStartKey, PAGE_BYTES)
+            self.stats['pages'] += 1
+            self.stats['items_read'] += scanned
+        if filter_condition:
+            items = [item for item in items if _evaluate(filter_condition, item, names, values)]
+        units = _read_units(size, ConsistentRead)
+        self._charge(read_units=units)
+        response = {
+            'Items': [_project(item, ProjectionExpression, names) for item in items],
+            'Count': len(items),
+            'ScannedCount': scanned
+        }
+        if last:
+            response['LastEvaluatedKey'] = last
+        return _with_capacity(response, TableName, units, ReturnConsumedCapacity)
+
+    def batch_write_item(self, RequestItems, ReturnConsumedCapacity='NONE'):
+        self._call('batch_write_item')
+        if sum(len(requests) for requests in RequestItems.values()) > BATCH_WRITE_LIMIT:
+            raise _error('ValidationException', f'Too many items requested for the BatchWriteItem call')
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            raise _error('ProvisionedThroughputExceededException', 'The level of configured provisioned throughput '
+                                                                   'for the table was exceeded')
+        unprocessed = {}
+        consumed = []
+        partial = self.unprocessed_rate and self.random.random() < self.unprocessed_rate
+        for table_name, requests in RequestItems.items():
+            units = 0
+            with self.lock:
+                table = self._table(table_name)
+                for n, request in enumerate(requests):
+                    if partial and n >= len(requests) // 2:
+                        unprocessed.setdefault(table_name, []).append(request)
+                        self.stats['unprocessed'] += 1
+                        continue
+                    if 'PutRequest' in request:
+                        item = request['PutRequest']['Item']
+                        old = table.get(item)
+                        units += _write_units(max(table.size(old) if old else 0, _item_size(item)))
+                        table.put(item)
+                    else:
+                        key = request['DeleteRequest']['Key']
+                        old = table.get(key)
+                        units += _write_units(table.size(old) if old else 0)
+                        table.delete(key)
+                    self.stats['items_written'] += 1
+            self._charge(write_units=units)
+            consumed.append({'TableName': table_name, 'CapacityUnits': units})
+        response = {'UnprocessedItems': unprocessed}
+        if ReturnConsumedCapacity != 'NONE':
+            response['ConsumedCapacity'] = consumed
+        return response
+
+    def batch_get_item(self, RequestItems, ReturnConsumedCapacity='NONE'):
+        self._call('batch_get_item')
+        if sum(len(request['Keys']) for request in RequestItems.values()) > BATCH_GET_LIMIT:
+            raise _error('ValidationException', 'Too many items requested for the BatchGetItem call')
+        responses = {}
+        unprocessed = {}
+        consumed = []
+        partial = self.unprocessed_rate and self.random.random() < self.unprocessed_rate
+        for table_name, request in RequestItems.items():
+            units = 0
+            found = responses.setdefault(table_name, [])
+            with self.lock:
+                table = self._table(table_name)
+                for n, key in enumerate(request['Keys']):
+                    if partial and n >= len(request['Keys']) // 2:
+                        pending = unprocessed.setdefault(table_name, dict(request, Keys=[]))
+                        pending['Keys'].append(key)
+                        self.stats['unprocessed'] += 1
+                        continue
+                    item = table.get(key)
+                    units += _read_units(table.size(item) if item else 0, request.get('ConsistentRead', False))
+                    if item:
+                        found.append(_project(item, request.get('ProjectionExpression'),
+                                              request.get('ExpressionAttributeNames')))
+                        self.stats['items_read'] += 1
+            self._charge(read_units=units)
+            consumed.append({'TableName': table_name, 'CapacityUnits': units})
+        response = {'Responses': responses, 'UnprocessedKeys': unprocessed}
+        if ReturnConsumedCapacity != 'NONE':
+            response['ConsumedCapacity'] = consumed
+        return response
+
+    def transact_write_items(self, TransactItems, ReturnConsumedCapacity='NONE', ClientRequestToken=None):
+        """
+        Apply puts, updates, deletes and condition checks all or nothing. Capacity is charged twice, as DynamoDB does.
+        """
+        self._call('transact_write_items')
+        if len(TransactItems) > TRANSACT_LIMIT:
+            raise _error('ValidationException', 'Member must have length less than or equal to 100')
+        with self.lock:
+            reasons = []
+            writes = []
+            units = {}
+            for entry in TransactItems:
+                (kind, params), = entry.items()
+                table = self._table(params['TableName'])
+                key = params.get('Item') or params['Key']
+                old = table.get(key)
+                try:
+                    _check(params.get('ConditionExpression'), old, params.get('ExpressionAttributeNames'),
+                           params.get('ExpressionAttributeValues'))
+                    reasons.append({'Code': 'None'})
+                except ClientError:
+                    reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+                if kind == 'Put':
+                    new = params['Item']
+                elif kind == 'Update':
+                    new = _update(old, key, params['UpdateExpression'], params.get('ExpressionAttributeNames'),
+                                  params.get('ExpressionAttributeValues'))
+                else:
+                    new = None
+                size = max(table.size(old) if old else 0, _item_size(new) if new else 0)
+                units[params['TableName']] = units.get(params['TableName'], 0) + 2 * _write_units(size)
+                writes.append((kind, table, key, new))
+            self._charge(write_units=sum(units.values()))
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise _error('TransactionCanceledException',
+                             f'Transaction cancelled, please refer cancellation reasons for specific reasons '
+                             f'[{", ".join(reason["Code"] for reason in reasons)}]',
+                             CancellationReasons=reasons)
+            for kind, table, key, new in writes:
+                if kind in ['Put', 'Update']:
+                    table.put(new)
+                elif kind == 'Delete':
+                    table.delete(key)
+            self.stats['items_written'] += sum(1 for kind, _, _, _ in writes if kind != 'ConditionCheck')
+        response = {}
+        if ReturnConsumedCapacity != 'NONE':
+            response['ConsumedCapacity'] = [{'TableName': t, 'CapacityUnits': u} for t, u in units.items()]
+        return response
+
+
+class _Top:
+    """
+    Sentinel that sorts after every value, used to find the end of a run of equal index keys.
+    """
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+_TOP = _Top()
+
+
+class _Table:
+    """
+    Items of one table with a sorted key list per partition for the table and for each local secondary index.
+    """
+
+    def __init__(self, key_schema, local_indexes):
+        self.hash_key = _key_name(key_schema, 'HASH')
+        self.range_key = _key_name(key_schema, 'RANGE')
+        self.items = {}
+        self.sizes = {}
+        self.indexes = {None: _Index(self, None, None)}
+        for spec in local_indexes or ():
+            projection = spec.get('Projection', {})
+            if projection.get('ProjectionType') == 'ALL':
+                attributes = None
+            else:
+                attributes = [self.hash_key, self.range_key, _key_name(spec['KeySchema'], 'RANGE')]
+                attributes += projection.get('NonKeyAttributes', [])
+            self.indexes[spec['IndexName']] = _Index(self, _key_name(spec['KeySchema'], 'RANGE'), attributes)
+
+    def index(self, name):
+        if name not in self.indexes:
+            raise _error('ValidationException', f'The table does not have the specified index: {name}')
+        return self.indexes[name]
+
+    def key_of(self, item):
+        try:
+            return _value(item[self.hash_key]), _value(item[self.range_key])
+        except KeyError:
+            raise _error('ValidationException', 'The provided key element does not match the schema')
+
+    def get(self, key):
+        return self.items.get(self.key_of(key))
+
+    def size(self, item):
+        return self.sizes[self.key_of(item)]
+
+    def put(self, item):
+        key = self.key_of(item)
+        old = self.items.get(key)
+        for index in self.indexes.values():
+            index.replace(key, old, item)
+        self.items[key] = item
+        self.sizes[key] = _item_size(item)
+
+    def delete(self, key):
+        key = self.key_of(key)
+        old = self.items.pop(key, None)
+        if old:
+            del self.sizes[key]
+            for index in self.indexes.values():
+                index.replace(key, old, None)
+
+
+class _Index:
+    """
+    Sorted entries per partition. Entries are (range key,) for the table and (index range key, range key) for
+    a local secondary index, which only holds items that have the index range key attribute.
+    """
+
+    def __init__(self, table, range_key, attributes):
+        self.table = table
+        self.range_key = range_key
+        self.attributes = attributes
+        self.partitions = {}
+
+    def _entry(self, key, item):
+        if self.range_key is None:
+            return key[1],
+        if self.range_key in item:
+            return _value(item[self.range_key]), key[1]
+
+    def replace(self, key, old, new):
+        entries = self.partitions.setdefault(key[0], [])
+        before = self._entry(key, old) if old else None
+        after = self._entry(key, new) if new else None
+        if before == after:
+            return
+        if before is not None:
+            del entries[bisect.bisect_left(entries, before)]
+        if after is not None:
+            bisect.insort(entries, after)
+
+    def _size(self, item):
+        if self.attributes is None:
+            return self.table.size(item)
+        return _item_size({name: value for name, value in item.items() if name in self.attributes})
+
+    def _start_key(self, start_key):
+        key = self.table.key_of(start_key)
+        return self._entry(key, start_key)
+
+    def query(self, condition, names, values, forward, limit, start_key, page_bytes):
+        """
+        Evaluate key condition over the sorted entries of its partition, starting after the exclusive start key.
+        Stop after limit items are evaluated or page_bytes are read.
+        Return matching items, number of items evaluated, bytes read and last evaluated key, if stopped early.
+        """
+        partition, low, high, range_condition = self._analyze(condition, names, values)
+        entries = self.partitions.get(partition, [])
+        if forward:
+            start = bisect.bisect_left(entries, (low,)) if low is not None else 0
+            if start_key:
+                start = max(start, bisect.bisect_right(entries, self._start_key(start_key)))
+            positions = range(start, len(entries))
+        else:
+            end = bisect.bisect_right(entries, (high, _TOP)) if high is not None else len(entries)
+            if start_key:
+                end = min(end, bisect.bisect_left(entries, self._start_key(start_key)))
+            positions = range(end - 1, -1, -1)
+
+        items = []
+        size = 0
+        stopped = False
+        for position in positions:
+            entry = entries[position]
+            if forward and high is not None and entry[0] > high:
+                break
+            if not forward and low is not None and entry[0] < low:
+                break
+            item = self.table.items[(partition, entry[-1])]
+            if range_condition and not _evaluate(range_condition, item, names, values):
+                continue
+            if (limit and len(items) == limit) or size >= page_bytes:
+                stopped = True
+                break
+            items.append(item)
+            size += self._size(item)
+
+        if not stopped:
+            return items, len(items), size, None
+        last = items[-1]
+        last_key = {self.table.hash_key: last[self.table.hash_key], self.table.range_key: last[self.table.range_key]}
+        if self.range_key:
+            last_key[self.range_key] = last[self.range_key]
+        return items, len(items), size, last_key
+
+    def _analyze(self, condition, names, values):
+        """
+        Split key condition into partition key value, range key bounds and range key condition.
+        """
+        parts = _conjuncts(condition)
+        partition = None
+        range_condition = None
+        for part in parts:
+            if part[0] == 'cmp' and part[1] == '=' and _path_name(part[2], names) == self.table.hash_key:
+                partition = _value(_operand(part[3], None, names, values))
+            else:
+                range_condition = part
+        if partition is None:
+            raise _error('ValidationException', 'Query condition missed key schema element')
+
+        low = high = None
+        if range_condition:
+            kind = range_condition[0]
+            if kind == 'cmp':
+                bound = _value(_operand(range_condition[3], None, names, values))
+                op = range_condition[1]
+                if op in ['=', '>', '>=']:
+                    low = bound
+                if op in ['=', '<', '<=']:
+                    high = bound
+            elif kind == 'between':
+                low = _value(_operand(range_condition[2], None, names, values))
+                high = _value(_operand(range_condition[3], None, names, values))
+            elif kind == 'fn' and range_condition[1] == 'begins_with':
+                low = _value(_operand(range_condition[2][1], None, names, values))
+                high = low + '\U0010ffff'
+        return partition, low, high, range_condition
+
+
+def _key_name(key_schema, key_type):
+    for element in key_schema:
+        if element['KeyType'] == key_type:
+            return element['AttributeName']
+
+
+def _error(code, message, **extra):
+    response = {'Error': {'Code': code, 'Message': message}}
+    response.update(extra)
+    return ClientError(response, code)
+
+
+def _with_capacity(response, table_name, units, mode):
+    if mode and mode != 'NONE':
+        response['ConsumedCapacity'] = {'TableName': table_name, 'CapacityUnits': units}
+    return response
+
+
+def _read_units(size, consistent):
+    units = max(1, math.ceil(size / READ_UNIT_BYTES))
+    return units if consistent else units / 2
+
+
+def _write_units(size):
+    return max(1, math.ceil(size / WRITE_UNIT_BYTES))
+
+
+def _item_size(item):
+    return sum(len(name) + _attribute_size(value) for name, value in item.items())
+
+
+def _attribute_size(value):
+    (kind, data), = value.items()
+    if kind == 'S':
+        return len(data.encode())
+    if kind == 'N':
+        return (len(data.lstrip('-').replace('.', '')) + 1) // 2 + 1
+    if kind == 'M':
+        return 3 + sum(len(name) + _attribute_size(v) + 1 for name, v in data.items())
+    if kind == 'L':
+        return 3 + sum(_attribute_size(v) + 1 for v in data)
+    if kind in ['SS', 'NS']:
+        return sum(len(v) for v in data)
+    return 1
+
+
+def _value(attribute):
+    """
+    Map typed attribute value to comparable Python value.
+    """
+    if attribute is None:
+        return None
+    (kind, data), = attribute.items()
+    if kind == 'N':
+        return Decimal(data)
+    if kind == 'NS':
+        return frozenset(Decimal(v) for v in data)
+    if kind == 'SS':
+        return frozenset(data)
+    if kind == 'NULL':
+        return None
+    return data
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise _error('ValidationException', f'Invalid expression: {expression}')
+        position = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'word' and text.upper() in KEYWORDS:
+            tokens.append(('keyword', text.upper()))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser for condition, update and projection expressions. Produces tuples:
+    ('path', parts), ('value', placeholder), ('cmp', op, a, b), ('between', a, low, high), ('in', a, options),
+    ('and', a, b), ('or', a, b), ('not', a), ('fn', name, args) and ('arith', op, a, b).
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def peek(self, offset=0):
+        position = self.position + offset
+        return self.tokens[position] if position < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, text=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (text and token[1] != text):
+            raise _error('ValidationException', f'Invalid expression: {self.expression}, unexpected {token[1]}')
+        self.position += 1
+        return token
+
+    def accept(self, kind, text=None):
+        token = self.peek()
+        if token[0] == kind and (text is None or token[1] == text):
+            self.position += 1
+            return True
+        return False
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    def condition(self):
+        node = self.conjunction()
+        while self.accept('keyword', 'OR'):
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept('keyword', 'AND'):
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept('keyword', 'NOT'):
+            return ('not', self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        if self.accept('op', '('):
+            node = self.condition()
+            self.take('op', ')')
+            return node
+        kind, text = self.peek()
+        if kind == 'word' and text in FUNCTIONS and text != 'size' and self.peek(1) == ('op', '('):
+            return self.function()
+        left = self.operand()
+        if self.accept('keyword', 'BETWEEN'):
+            low = self.operand()
+            self.take('keyword', 'AND')
+            return ('between', left, low, self.operand())
+        if self.accept('keyword', 'IN'):
+            self.take('op', '(')
+            options = [self.operand()]
+            while self.accept('op', ','):
+                options.append(self.operand())
+            self.take('op', ')')
+            return ('in', left, options)
+        op = self.take('op')[1]
+        if op not in ['=', '<>', '<', '<=', '>', '>=']:
+            raise _error('ValidationException', f'Invalid expression: {self.expression}, unexpected {op}')
+        return ('cmp', op, left, self.operand())
+
+    def function(self):
+        name = self.take('word')[1]
+        self.take('op', '(')
+        args = [self.operand()]
+        while self.accept('op', ','):
+            args.append(self.operand())
+        self.take('op', ')')
+        return ('fn', name, args)
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == 'value':
+            self.position += 1
+            return ('value', text)
+        if kind == 'word' and text in FUNCTIONS and self.peek(1) == ('op', '('):
+            return self.function()
+        return self.path()
+
+    def path(self):
+        parts = [self.name()]
+        while self.accept('op', '.'):
+            parts.append(self.name())
+        return ('path', parts)
+
+    def name(self):
+        kind, text = self.peek()
+        if kind not in ['name', 'word']:
+            raise _error('ValidationException', f'Invalid expression: {self.expression}, unexpected {text}')
+        self.position += 1
+        return text
+
+    def update(self):
+        """
+        Parse update expression into list of (action, path, operand) tuples.
+        """
+        actions = []
+        while not self.done():
+            clause = self.take('keyword')[1]
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.take('op', '=')
+                    value = self.operand()
+                    if self.peek() in [('op', '+'), ('op', '-')]:
+                        value = ('arith', self.take('op')[1], value, self.operand())
+                    actions.append(('SET', path, value))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                else:
+                    actions.append((clause, path, self.operand()))
+                if not self.accept('op', ','):
+                    break
+        return actions
+
+    def projection(self):
+        paths = [self.path()]
+        while self.accept('op', ','):
+            paths.append(self.path())
+        return paths
+
+
+_parsed = {}
+
+
+def _parse(expression, kind):
+    key = (expression, kind)
+    node = _parsed.get(key)
+    if node is None:
+        parser = _Parser(expression)
+        node = getattr(parser, kind)()
+        if not parser.done():
+            raise _error('ValidationException', f'Invalid expression: {expression}')
+        _parsed[key] = node
+    return node
+
+
+def _parse_condition(expression):
+    return _parse(expression, 'condition')
+
+
+def _conjuncts(node):
+    if node[0] == 'and':
+        return _conjuncts(node[1]) + _conjuncts(node[2])
+    return [node]
+
+
+def _resolve(part, names):
+    if part.startswith('#'):
+        if not names or part not in names:
+            raise _error('ValidationException', f'An expression attribute name used in the document path '
+                                                f'is not defined; attribute name: {part}')
+        return names[part]
+    return part
+
+
+def _path_name(node, names):
+    return _resolve(node[1][0], names) if node[0] == 'path' and len(node[1]) == 1 else None
+
+
+def _lookup(item, parts, names):
+    value = {'M': item} if item is not None else None
+    for part in parts:
+        if value is None or 'M' not in value:
+            return None
+        value = value['M'].get(_resolve(part, names))
+    return value
+
+
+def _operand(node, item, names, values):
+    kind = node[0]
+    if kind == 'value':
+        if not values or node[1] not in values:
+            raise _error('ValidationException', f'An expression attribute value used in expression '
+                                                f'is not defined; attribute value: {node[1]}')
+        return values[node[1]]
+    if kind == 'path':
+        return _lookup(item, node[1], names)
+    if kind == 'fn' and node[1] == 'size':
+        value = _operand(node[2][0], item, names, values)
+        if value is None:
+            return None
+        (data_kind, data), = value.items()
+        return {'N': str(len(data.encode()) if data_kind == 'S' else len(data))}
+    if kind == 'fn' and node[1] == 'if_not_exists':
+        value = _operand(node[2][0], item, names, values)
+        return value if value is not None else _operand(node[2][1], item, names, values)
+    if kind == 'arith':
+        left = _value(_operand(node[2], item, names, values))
+        right = _value(_operand(node[3], item, names, values))
+        return {'N': str(left + right if node[1] == '+' else left - right)}
+    raise _error('ValidationException', f'Unsupported operand {node}')
+
+
+def _compare(op, left, right):
+    if left is None or right is None:
+        return False
+    if next(iter(left)) != next(iter(right)):
+        return op == '<>'
+    a, b = _value(left), _value(right)
+    if op == '=':
+        return a == b
+    if op == '<>':
+        return a != b
+    if op == '<':
+        return a < b
+    if op == '<=':
+        return a <= b
+    if op == '>':
+        return a > b
+    return a >= b
+
+
+def _evaluate(node, item, names, values):
+    kind = node[0]
+    if kind == 'and':
+        return _evaluate(node[1], item, names, values) and _evaluate(node[2], item, names, values)
+    if kind == 'or':
+        return _evaluate(node[1], item, names, values) or _evaluate(node[2], item, names, values)
+    if kind == 'not':
+        return not _evaluate(node[1], item, names, values)
+    if kind == 'cmp':
+        return _compare(node[1], _operand(node[2], item, names, values), _operand(node[3], item, names, values))
+    if kind == 'between':
+        value = _operand(node[1], item, names, values)
+        return (_compare('>=', value, _operand(node[2], item, names, values))
+                and _compare('<=', value, _operand(node[3], item, names, values)))
+    if kind == 'in':
+        value = _operand(node[1], item, names, values)
+        return any(_compare('=', value, _operand(option, item, names, values)) for option in node[2])
+    if kind == 'fn':
+        name, args = node[1], node[2]
+        if name == 'attribute_exists':
+            return _operand(args[0], item, names, values) is not None
+        if name == 'attribute_not_exists':
+            return _operand(args[0], item, names, values) is None
+        value = _value(_operand(args[0], item, names, values))
+        operand = _value(_operand(args[1], item, names, values))
+        if value is None or operand is None:
+            return False
+        if name == 'begins_with':
+            return isinstance(value, str) and value.startswith(operand)
+        if name == 'contains':
+            return operand in value
+    raise _error('ValidationException', f'Unsupported condition {node}')
+
+
+def _check(expression, item, names, values):
+    """
+    Raise conditional check failure unless condition expression holds for item, which may be None.
+    """
+    if expression and not _evaluate(_parse_condition(expression), item, names, values):
+        raise _error('ConditionalCheckFailedException', 'The conditional request failed')
+
+
+def _update(item, key, expression, names, values):
+    """
+    Apply update expression to copy of item, or to new item with key if item is None.
+    """
+    item = _copy(item) if item else dict(key)
+    for action, path, operand in _parse(expression, 'update'):
+        parent = {'M': item}
+        for part in path[1][:-1]:
+            parent = parent['M'].setdefault(_resolve(part, names), {'M': {}})
+        name = _resolve(path[1][-1], names)
+        target = parent['M']
+        if action == 'SET':
+            target[name] = _operand(operand, item, names, values)
+        elif action == 'REMOVE':
+            target.pop(name, None)
+        elif action == 'ADD':
+            value = _operand(operand, item, names, values)
+            current = target.get(name)
+            if 'N' in value:
+                total = (_value(current) if current else 0) + _value(value)
+                target[name] = {'N': str(total)}
+            else:
+                (kind, data), = value.items()
+                target[name] = {kind: sorted(set(current[kind] if current else []) | set(data))}
+        elif action == 'DELETE':
+            value = _operand(operand, item, names, values)
+            (kind, data), = value.items()
+            if name in target:
+                target[name] = {kind: sorted(set(target[name][kind]) - set(data))}
+    return item
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _project(item, expression, names):
+    if not expression:
+        return item
+    projected = {}
+    for path in _parse(expression, 'projection'):
+        value = _lookup(item, path[1], names)
+        if value is None:
+            continue
+        target = projected
+        for part in path[1][:-1]:
+            target = target.setdefault(_resolve(part, names), {'M': {}})['M']
+        target[_resolve(path[1][-1], names)] = value
+    return projected
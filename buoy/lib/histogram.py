@@ -0,0 +1,96 @@
+HISTOGRAM_MONTH = 'monthhist'
+HISTOGRAM_MONTH_DAY = 'monthdayhist'
+
+
+def bucket_of(wave_height):
+    """
+    Map wave height in meters to integer histogram bucket in centimeters. Observations have 0.01 m precision,
+    so every distinct stored value falls into its own bucket.
+    """
+    return round(float(wave_height) * 100)
+
+
+def keys_of(time):
+    """
+    Make histogram (partition, key) pairs covering observation time in the form YYYYMMDDHH.
+    """
+    return [(HISTOGRAM_MONTH, time[4:6]), (HISTOGRAM_MONTH_DAY, time[4:8])]
+
+
+def add_deltas(deltas, time, bucket, n):
+    """
+    Add count n to bucket of histograms covering observation time.
+    """
+    for key in keys_of(time):
+        counts = deltas.setdefault(key, {})
+        counts[bucket] = counts.get(bucket, 0) + n
+
+
+def compute_deltas(records, existing):
+    """
+    Compute histogram count changes for writing records over existing items.
+    Input existing is a dictionary of time key to previously stored wave height.
+    Result is a dictionary of (partition, key) to dictionary of bucket to count delta.
+    """
+    deltas = {}
+    for record in records:
+        time = record.time
+        bucket = bucket_of(record.wave_height)
+        prior = existing.get(time)
+        if prior is not None:
+            prior_bucket = bucket_of(prior)
+            if prior_bucket == bucket:
+                continue
+            add_deltas(deltas, time, prior_bucket, -1)
+        add_deltas(deltas, time, bucket, 1)
+    return {key: counts for key, counts in deltas.items() if any(counts.values())}
+
+
+def merge_deltas(deltas, other):
+    """
+    Merge histogram count changes of other into deltas.
+    """
+    for key, counts in other.items():
+        merged = deltas.setdefault(key, {})
+        for bucket, n in counts.items():
+            merged[bucket] = merged.get(bucket, 0) + n
+    return deltas
+
+
+def apply_deltas(counts, deltas):
+    """
+    Apply bucket count deltas to counts dictionary, dropping empty buckets.
+    """
+    for bucket, n in deltas.items():
+        total = counts.get(bucket, 0) + n
+        if total > 0:
+            counts[bucket] = total
+        else:
+            counts.pop(bucket, None)
+    return counts
+
+
+def counts_from_item(item):
+    """
+    Extract bucket counts dictionary from histogram table item.
+    """
+    return {int(bucket): int(count['N']) for bucket, count in item['counts']['M'].items()}
+
+
+def counts_to_attribute(counts):
+    """
+    Make DynamoDB map attribute from bucket counts dictionary.
+    """
+    return {'M': {str(bucket): {'N': str(count)} for bucket, count in counts.items()}}
+
+
+def percentile(counts, value):
+    """
+    Calculate percentile of input value over histogram bucket counts.
+    Matches dbquery.percentile over the individual values represented by the histogram.
+    """
+    target = bucket_of(value)
+    cnt = sum(count for bucket, count in counts.items() if bucket <= target)
+    total = sum(counts.values())
+    per = int(cnt / total * 100) if total else 0
+    return per, cnt, total
@@ -0,0 +1,193 @@
+import json
+import time
+import functools
+import threading
+import contextlib
+import contextvars
+from botocore.exceptions import ClientError
+from buoy.lib import batchput
+from buoy.lib import capacity
+
+NAMESPACE = 'BuoyBot'
+
+UNATTRIBUTED = ('', 'unattributed')
+
+CONDITIONAL_ERROR_CODES = ['ConditionalCheckFailedException', 'TransactionCanceledException']
+
+# recorded statistic, CloudWatch metric name and unit
+METRICS = [
+    ('invocations', 'Invocations', 'Count'),
+    ('latency', 'Latency', 'Milliseconds'),
+    ('calls', 'Calls', 'Count'),
+    ('call_ms', 'CallTime', 'Milliseconds'),
+    ('pages', 'Pages', 'Count'),
+    ('items_read', 'ItemsRead', 'Count'),
+    ('items_written', 'ItemsWritten', 'Count'),
+    ('rcu', 'ReadCapacityUnits', 'Count'),
+    ('wcu', 'WriteCapacityUnits', 'Count'),
+    ('retries', 'Retries', 'Count'),
+    ('conditional_failures', 'ConditionalCheckFailures', 'Count'),
+    ('errors', 'Errors', 'Count')
+]
+
+# (buoy, operation name) of the innermost logical operation running in the current context
+_current = contextvars.ContextVar('operation', default=UNATTRIBUTED)
+
+
+class Recorder:
+    """
+    Statistics of DynamoDB calls and latencies per (buoy, logical operation), emitted as
+    CloudWatch embedded metric format (EMF) JSON lines. Recording is a no-op until an instrumented client
+    enables it, so processes that never emit do not accumulate statistics.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.enabled = False
+
+    def _stats(self, key):
+        stats = self.operations.get(key)
+        if stats is None:
+            stats = {name: 0 for name, _, _ in METRICS}
+            stats['latency'] = []
+            self.operations[key] = stats
+        return stats
+
+    def record_call(self, key, counts):
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self._stats(key)
+            for name, value in counts.items():
+                stats[name] += value
+
+    def record_latency(self, key, ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self._stats(key)
+            stats['invocations'] += 1
+            stats['latency'].append(round(ms, 3))
+
+    def emit(self, namespace=NAMESPACE, write=print):
+        """
+        Write one EMF JSON line per recorded operation and start over. Lines go to stdout by default,
+        where CloudWatch Logs picks them up from a Lambda function.
+        """
+        with self.lock:
+            operations, self.operations = self.operations, {}
+        timestamp = int(time.time() * 1000)
+        for (buoy, name), stats in sorted(operations.items()):
+            document = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': namespace,
+                        'Dimensions': [['Buoy', 'Operation']],
+                        'Metrics': [{'Name': metric, 'Unit': unit} for _, metric, unit in METRICS]
+                    }]
+                },
+                'Buoy': buoy,
+                'Operation': name
+            }
+            for stat, metric, _ in METRICS:
+                value = stats[stat]
+                document[metric] = round(value, 3) if isinstance(value, float) else value
+            write(json.dumps(document))
+
+
+RECORDER = Recorder()
+
+
+@contextlib.contextmanager
+def scope(buoy, name, recorder=RECORDER):
+    """
+    Attribute DynamoDB calls made in the enclosed block to logical operation name of buoy and record its latency.
+    Nested scopes take precedence over enclosing ones.
+    """
+    key = (buoy, name)
+    token = _current.set(key)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record_latency(key, (time.perf_counter() - start) * 1000)
+        _current.reset(token)
+
+
+def operation(fn):
+    """
+    Method decorator that runs the method in a scope named after it, for the buoy of its instance.
+    """
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with scope(self.buoy, fn.__name__):
+            return fn(self, *args, **kwargs)
+    return wrapper
+
+
+class InstrumentedClient:
+    """
+    DynamoDB client wrapper that records latency, pages, items read and written, consumed capacity,
+    retries and failures of every read and write call against the current logical operation.
+    Every read and write operation requests ReturnConsumedCapacity. Other client attributes pass through unchanged.
+    Creating one enables recording on its recorder.
+    """
+
+    def __init__(self, client, recorder=RECORDER):
+        self.client = client
+        self.recorder = recorder
+        recorder.enabled = True
+
+    def __getattr__(self, name):
+        fn = getattr(self.client, name)
+        if name in capacity.READ_OPERATIONS or name in capacity.WRITE_OPERATIONS:
+            return self._instrumented(fn, name)
+        return fn
+
+    def _instrumented(self, fn, name):
+        def call(**kwargs):
+            kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+            key = _current.get()
+            counts = {'calls': 1}
+            start = time.perf_counter()
+            try:
+                response = fn(**kwargs)
+                units = capacity.consumed_units(response)
+                counts['rcu' if name in capacity.READ_OPERATIONS else 'wcu'] = units
+                counts.update(_item_counts(name, kwargs, response))
+                return response
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code in batchput.THROTTLE_ERROR_CODES:
+                    counts['retries'] = 1
+                elif code in CONDITIONAL_ERROR_CODES:
+                    counts['conditional_failures'] = 1
+                else:
+                    counts['errors'] = 1
+                raise
+            finally:
+                counts['call_ms'] = (time.perf_counter() - start) * 1000
+                self.recorder.record_call(key, counts)
+        return call
+
+
+def _item_counts(name, request, response):
+    """
+    Count pages, items read, items written and items left for retry in a successful call.
+    """
+    if name in ['query', 'scan']:
+        return {'pages': 1, 'items_read': response.get('ScannedCount', len(response['Items']))}
+    if name == 'get_item':
+        return {'items_read': 1 if 'Item' in response else 0}
+    if name == 'batch_get_item':
+        unprocessed = sum(len(r['Keys']) for r in (response.get('UnprocessedKeys') or {}).values())
+        return {'items_read': sum(len(items) for items in response['Responses'].values()), 'retries': unprocessed}
+    if name == 'batch_write_item':
+        requested = sum(len(requests) for requests in request['RequestItems'].values())
+        unprocessed = sum(len(requests) for requests in (response.get('UnprocessedItems') or {}).values())
+        return {'items_written': requested - unprocessed, 'retries': unprocessed}
+    if name == 'transact_write_items':
+        return {'items_written': len(request['TransactItems'])}
+    return {'items_written': 1}
@@ -1,6 +1,14 @@
+import time
+import zlib
+import random
+import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from collections import namedtuple
 
+logger = logging.getLogger(__name__)
+
 Month = namedtuple('Month', 'id name')
 
 MONTH_JAN = Month(1, 'Jan')
@@ -29,21 +37,220 @@ URL_REALTIME = URL_BASE + '/data'
 URL_MONTH = URL_REALTIME + '/stdmet/{month_name}/{buoy}.txt'
 URL_LAST_45 = URL_REALTIME + '/realtime2/{buoy}.txt'
 URL_LAST_5 = URL_REALTIME + '/5day2/{buoy}_5day.txt'
+URL_YEAR_RAW = URL_REALTIME + '/historical/stdmet/{buoy}h{year}.txt.gz'
+URL_YEAR_MONTH_RAW = URL_REALTIME + '/stdmet/{month_name}/{buoy}{month_id}{year}.txt.gz'
+
+TIMEOUT = (5, 60)  # connect and read timeouts in seconds
+RETRIES = 3
+FIRST_BACKOFF = 0.5  # retry n sleeps for a random time up to 0.5 * 2^n seconds
+POOL_SIZE = 10
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+CHUNK_SIZE = 64 * 1024
+
+
+class Client:
+    """
+    NOAA HTTP client with a pooled keep-alive session, timeouts and retries with jittered backoff.
+    Conditional fetches remember the ETag and Last-Modified validators of each URL and
+    send them as If-None-Match and If-Modified-Since on the next fetch of the same URL.
+    The base URL can point at a local HTTP stand-in.
+    An optional noaacache.Cache answers unconditional fetches and streams before the network.
+    """
+
+    def __init__(self, base_url=URL_BASE, timeout=TIMEOUT, retries=RETRIES, pool_size=POOL_SIZE, cache=None):
+        self.base_url = base_url
+        self.cache = cache
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.validators = {}
+
+    def url(self, url, **kwargs):
+        return url.replace(URL_BASE, self.base_url, 1).format(**kwargs)
+
+    def get(self, url, headers=None, stream=False):
+        """
+        Send GET request, retrying connection errors, timeouts and retryable status codes.
+        Raise HTTPError for an error status after the last attempt.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                res = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+                if res.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    res.raise_for_status()
+                    return res
+                res.close()
+                logger.debug(f'status {res.status_code} from {url}')
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise e
+                logger.debug(f'{type(e).__name__} from {url}')
+            sleep = random.uniform(0, FIRST_BACKOFF * 2 ** attempt)
+            logger.debug(f'retrying {url}, sleeping for {sleep:.2f} seconds')
+            time.sleep(sleep)
+
+    def fetch(self, url, conditional=False, immutable=False, **kwargs):
+        """
+        Fetch response body text. If conditional, return None when the body has not changed since the last fetch.
+        Immutable responses are cached without expiry, others for the cache time-to-live.
+        """
+        url = self.url(url, **kwargs)
+        if self.cache and not conditional:
+            text = self.cache.get(url, immutable)
+            if text is None:
+                text = self.get(url).text
+                self.cache.put(url, text, immutable)
+            return text
+        res = self.get(url, self.validators.get(url) if conditional else None)
+        if res.status_code == 304:
+            logger.info(f'not modified since last fetch: {url}')
+            return None
+        if conditional:
+            self._remember(url, res)
+        return res.text
+
+    def _remember(self, url, res):
+        validators = {}
+        if 'ETag' in res.headers:
+            validators['If-None-Match'] = res.headers['ETag']
+        if 'Last-Modified' in res.headers:
+            validators['If-Modified-Since'] = res.headers['Last-Modified']
+        self.validators[url] = validators
+
+    def forget(self, url=None, **kwargs):
+        """
+        Discard remembered validators of URL, or of every URL if none is given,
+        so the next conditional fetch returns the body.
+        """
+        if url:
+            self.validators.pop(self.url(url, **kwargs), None)
+        else:
+            self.validators.clear()
+
+    def stream(self, url, immutable=False, **kwargs):
+        """
+        Generate lines of response body as they arrive, without holding the full body in memory.
+        """
+        url = self.url(url, **kwargs)
+        if self.cache:
+            lines = self.cache.get_lines(url, immutable)
+            if lines is None:
+                lines = self.cache.tee_lines(url, self._stream(url), immutable)
+            yield from lines
+        else:
+            yield from self._stream(url)
+
+    def fetch_gzip(self, url, fallback_url, immutable=False, **kwargs):
+        """
+        Fetch raw gzip file and return decompressed text. Fall back to fetching text from
+        fallback URL if the gzip file is unavailable.
+        """
+        return '\n'.join(self.stream_gzip(url, fallback_url, immutable, **kwargs))
+
+    def stream_gzip(self, url, fallback_url, immutable=False, **kwargs):
+        """
+        Generate lines of raw gzip file, decompressing as compressed chunks arrive. Fall back to streaming
+        text from fallback URL if the gzip file is unavailable.
+        """
+        url = self.url(url, **kwargs)
+        lines = self.cache.get_lines(url, immutable) if self.cache else None
+        if lines is None:
+            try:
+                res = self.get(url, stream=True)
+            except requests.HTTPError as e:
+                logger.info(f'{e}, falling back to {self.url(fallback_url, **kwargs)}')
+                yield from self.stream(fallback_url, immutable, **kwargs)
+                return
+            lines = _gzip_lines(url, res)
+            if self.cache:
+                lines = self.cache.tee_lines(url, lines, immutable)
+        yield from lines
+
+    def _stream(self, url):
+        with self.get(url, stream=True) as res:
+            encoding = res.encoding or 'utf-8'
+            for line in res.iter_lines():
+                yield line.decode(encoding)
+
 
+def _gzip_lines(url, res):
+    """
+    Generate text lines of streamed gzip response body, which may hold several concatenated gzip members.
+    The body is read undecoded, so a Content-Encoding header cannot cause double decompression.
+    """
+    start = time.perf_counter()
+    received = 0
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pending = b''
+    with res:
+        for chunk in res.raw.stream(CHUNK_SIZE, decode_content=False):
+            received += len(chunk)
+            while chunk:
+                pending += decompressor.decompress(chunk)
+                chunk = decompressor.unused_data
+                if chunk:
+                    pending += decompressor.flush()
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                yield line.rstrip(b'\r').decode()
+    pending += decompressor.flush()
+    if pending:
+        yield pending.rstrip(b'\r').decode()
+    logger.info(f'received {received} compressed bytes in {time.perf_counter() - start:.2f} seconds from {url}')
 
-def fetch_data(url, **kwargs):
-    url = url.format(**kwargs)
-    res = requests.get(url)
-    res.raise_for_status()
-    return res.text
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def default_client():
+    """
+    Shared client for module-level fetch functions, created on first use and reused by warm Lambda containers.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client()
+        return _client
+
+
+def configure(cache=None):
+    """
+    Replace shared client with one using input noaacache.Cache.
+    """
+    global _client
+    with _client_lock:
+        _client = Client(cache=cache)
+
+
+def fetch_data(url, conditional=False, immutable=False, **kwargs):
+    return default_client().fetch(url, conditional, immutable, **kwargs)
+
+
+def stream_data(url, immutable=False, **kwargs):
+    return default_client().stream(url, immutable, **kwargs)
 
 
 def fetch_buoy_data_year(buoy, year):
-    return fetch_data(URL_YEAR, buoy=buoy, year=year)
+    return default_client().fetch_gzip(URL_YEAR_RAW, URL_YEAR, True, buoy=buoy, year=year)
 
 
 def fetch_buoy_data_year_month(buoy, year, month):
-    return fetch_data(URL_YEAR_MONTH, buoy=buoy, year=year, month_id=month.id, month_name=month.name)
+    return default_client().fetch_gzip(URL_YEAR_MONTH_RAW, URL_YEAR_MONTH, True,
+                                       buoy=buoy, year=year, month_id=month.id, month_name=month.name)
+
+
+def stream_buoy_data_year(buoy, year):
+    return default_client().stream_gzip(URL_YEAR_RAW, URL_YEAR, True, buoy=buoy, year=year)
+
+
+def stream_buoy_data_year_month(buoy, year, month):
+    return default_client().stream_gzip(URL_YEAR_MONTH_RAW, URL_YEAR_MONTH, True,
+                                        buoy=buoy, year=year, month_id=month.id, month_name=month.name)
 
 
 def fetch_buoy_data_month(buoy, month):
@@ -54,8 +261,12 @@ def fetch_buoy_data_last45(buoy):
     return fetch_data(URL_LAST_45, buoy=buoy)
 
 
-def fetch_buoy_data_last5(buoy):
-    return fetch_data(URL_LAST_5, buoy=buoy)
+def fetch_buoy_data_last5(buoy, conditional=False):
+    return fetch_data(URL_LAST_5, conditional, buoy=buoy)
+
+
+def forget_buoy_data_last5(buoy):
+    default_client().forget(URL_LAST_5, buoy=buoy)
 
 
 def resolve_month(name):
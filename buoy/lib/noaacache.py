@@ -0,0 +1,218 @@
+import os
+import gzip
+import atexit
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL = 600  # seconds a mutable realtime response stays fresh
+
+INDEX_FILE = 'index.json'
+
+# seconds between index saves for access times only, stores and evictions save it at once
+INDEX_SAVE_INTERVAL = 30
+
+
+class CacheMiss(LookupError):
+    """
+    Raised for a URL that is not cached while the cache is in offline mode.
+    """
+
+
+class Cache:
+    """
+    Content-addressed, compressed on-disk cache of NOAA response bodies.
+    Bodies are stored gzip-compressed in files named by the SHA-256 of their content, so identical bodies
+    share one file. An index maps each URL to its content hash, size, fetch time and last access time.
+    Immutable historical responses never expire. Mutable realtime responses expire after ttl seconds.
+    The least recently used URLs are evicted when the total size exceeds max_bytes.
+    Access times of hits are updated in memory and saved with the next store, at most every INDEX_SAVE_INTERVAL
+    seconds, and at exit.
+    In offline mode every lookup is answered from the cache, expired or not, and a miss raises CacheMiss.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, offline=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.index = self._load_index()
+        self.dirty = False
+        self.saved = time.time()
+        atexit.register(self.flush)
+
+    def _index_file(self):
+        return os.path.join(self.path, INDEX_FILE)
+
+    def _blob_file(self, digest):
+        return os.path.join(self.path, f'{digest}.gz')
+
+    def _load_index(self):
+        try:
+            with open(self._index_file()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_index(self):
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self._index_file())
+        self.dirty = False
+        self.saved = time.time()
+
+    def flush(self):
+        """
+        Save index if access times changed since it was last saved.
+        """
+        with self.lock:
+            if self.dirty:
+                self._save_index()
+
+    def _lookup(self, url, immutable):
+        """
+        Find fresh index entry for URL and mark it accessed. Raise CacheMiss in offline mode if absent.
+        """
+        with self.lock:
+            entry = self.index.get(url)
+            if entry and (immutable or entry['immutable'] or self.offline
+                          or time.time() - entry['fetched'] <= self.ttl):
+                if os.path.exists(self._blob_file(entry['digest'])):
+                    entry['accessed'] = time.time()
+                    self.dirty = True
+                    if entry['accessed'] - self.saved >= INDEX_SAVE_INTERVAL:
+                        self._save_index()
+                    return entry
+        if self.offline:
+            raise CacheMiss(url)
+
+    def get(self, url, immutable=False):
+        """
+        Return cached body text for URL or None on a miss.
+        """
+        entry = self._lookup(url, immutable)
+        if entry:
+            logger.debug(f'cache hit for {url}')
+            with gzip.open(self._blob_file(entry['digest']), 'rt', newline='') as f:
+                return f.read()
+
+    def get_lines(self, url, immutable=False):
+        """
+        Return generator of cached body lines for URL or None on a miss.
+        """
+        entry = self._lookup(url, immutable)
+        if entry:
+            logger.debug(f'cache hit for {url}')
+            return _read_lines(self._blob_file(entry['digest']))
+
+    def put(self, url, text, immutable=False):
+        """
+        Store body text for URL.
+        """
+        data = text.encode()
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            f.write(data)
+        self._commit(url, tmp, hashlib.sha256(data).hexdigest(), immutable)
+
+    def tee_lines(self, url, lines, immutable=False):
+        """
+        Generate lines while storing them for URL. The body is stored only if all lines are consumed.
+        """
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        committed = False
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for line in lines:
+                    data = f'{line}\n'.encode()
+                    f.write(data)
+                    digest.update(data)
+                    yield line
+            self._commit(url, tmp, digest.hexdigest(), immutable)
+            committed = True
+        finally:
+            if not committed and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _commit(self, url, tmp, digest, immutable):
+        """
+        Move compressed body file into place under its content hash, index it and evict if over size.
+        """
+        with self.lock:
+            blob = self._blob_file(digest)
+            if os.path.exists(blob):
+                os.remove(tmp)
+            else:
+                os.replace(tmp, blob)
+            now = time.time()
+            self.index[url] = {
+                'digest': digest,
+                'size': os.path.getsize(blob),
+                'immutable': immutable,
+                'fetched': now,
+                'accessed': now
+            }
+            self._evict()
+            self._save_index()
+        logger.debug(f'cached {url} as {digest}')
+
+    def _evict(self):
+        """
+        Remove least recently used URLs until the total size of content files is within bounds.
+        """
+        sizes = {entry['digest']: entry['size'] for entry in self.index.values()}
+        total = sum(sizes.values())
+        for url, entry in sorted(self.index.items(), key=lambda e: e[1]['accessed']):
+            if total <= self.max_bytes:
+                break
+            del self.index[url]
+            digest = entry['digest']
+            if all(e['digest'] != digest for e in self.index.values()):
+                total -= sizes[digest]
+                os.remove(self._blob_file(digest))
+                logger.debug(f'evicted {url} from cache')
+
+
+def _read_lines(path):
+    with gzip.open(path, 'rt', newline='') as f:
+        for line in f:
+            yield line.rstrip('\r\n')
+
+
+def add_arguments(parser):
+    """
+    Add cache command line options to argument parser.
+    """
+    parser.add_argument('--cache', help="NOAA response cache directory")
+    parser.add_argument('--cache-size', help="NOAA response cache size in megabytes", type=int,
+                        default=DEFAULT_MAX_BYTES // 1024 // 1024)
+    parser.add_argument('--cache-ttl', help="Seconds a cached realtime response stays fresh", type=int,
+                        default=DEFAULT_TTL)
+    parser.add_argument('--offline', help="Replay NOAA responses from the cache only", action='store_true')
+
+
+def check_arguments(parser, args):
+    """
+    Exit with a usage error if offline mode is requested without a cache directory.
+    """
+    if args.offline and not args.cache:
+        parser.error('--offline requires --cache')
+
+
+def from_args(args):
+    """
+    Make cache from parsed command line options, or None if no cache directory is given.
+    """
+    if not args.cache:
+        return None
+    return Cache(args.cache, args.cache_size * 1024 * 1024, args.cache_ttl, args.offline)
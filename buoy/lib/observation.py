@@ -0,0 +1,58 @@
+FIELDS = ('year', 'month', 'day', 'hour', 'minute',
+          'wave_height', 'wave_direction', 'dominant_period', 'average_period')
+
+TIME_FIELDS = ('time', 'year_month', 'month_day')
+
+
+class Observation:
+    """
+    Compact buoy observation record produced by parse.py.
+    Fields are slots rather than dictionary entries. Dictionary-style access by field name
+    is supported for callers that index records, such as record['wave_height'].
+    """
+
+    __slots__ = FIELDS + TIME_FIELDS
+
+    def __init__(self, year, month, day, hour, minute, wave_height, wave_direction, dominant_period, average_period):
+        self.year = year
+        self.month = month
+        self.day = day
+        self.hour = hour
+        self.minute = minute
+        self.wave_height = wave_height
+        self.wave_direction = wave_direction
+        self.dominant_period = dominant_period
+        self.average_period = average_period
+        self.time = None
+        self.year_month = None
+        self.month_day = None
+
+    def keys(self):
+        return FIELDS + TIME_FIELDS if self.time is not None else FIELDS
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __eq__(self, other):
+        if not isinstance(other, Observation):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        return repr(self.to_dict())
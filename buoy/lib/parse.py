@@ -1,9 +1,19 @@
 import datetime
-import pytz
 import logging
+from collections import OrderedDict
+from buoy.lib.observation import Observation
 
 logger = logging.getLogger(__name__)
 
+NORMALIZE_WINDOW = 1000
+
+REASON_NONE = 0
+REASON_BAD_DATE = 1
+REASON_NO_WAVE_HEIGHT = 2
+REASON_DUP_TIME = 3
+
+REASON_NAMES = [None, 'bad_date', 'no_wave_height', 'dup_time']
+
 
 def column_index_of(headers, target):
     for n in range(len(headers)):
@@ -28,7 +38,14 @@ def parse_float(values, index, range):
 
 
 def parse_data(data):
-    lines = iter(data.splitlines())
+    return list(parse_lines(data.splitlines()))
+
+
+def parse_lines(lines):
+    """
+    Generate observation records from iterable of lines, starting with header line.
+    """
+    lines = iter(lines)
 
     header_line = next(lines)
     if header_line.startswith('#'):
@@ -48,8 +65,6 @@ def parse_data(data):
     index_dom_period = column_index_of(headers, 'DPD')
     index_avg_period = column_index_of(headers, 'APD')
 
-    records = []
-
     for line in lines:
         words = line.split()
         year_short = parse_int(words, index_year_short, (70, 98))
@@ -67,86 +82,124 @@ def parse_data(data):
         year_normal = year_short + 1900 if year_short else (year_long1 if year_long1 else year_long2)
         minute_normal = minute if minute is not None else 0
 
-        record = {
-            'year': year_normal,
-            'month': month,
-            'day': day,
-            'hour': hour,
-            'minute': minute_normal,
-            'wave_height': wave_height,
-            'wave_direction': wave_dir,
-            'dominant_period': dom_period,
-            'average_period': avg_period
-        }
-
-        records.append(record)
-
-    return records
+        yield Observation(year_normal, month, day, hour, minute_normal, wave_height, wave_dir, dom_period, avg_period)
 
 
 def has_bad_date(record):
-    return (record['year'] is None
-            or record['month'] is None
-            or record['day'] is None
-            or record['hour'] is None
-            or record['minute'] is None)
+    return (record.year is None
+            or record.month is None
+            or record.day is None
+            or record.hour is None
+            or record.minute is None)
 
 
 def has_more_info_than(left, right):
-    return ((left['dominant_period'] is not None and right['dominant_period'] is None)
-            or (left['average_period'] is not None and right['average_period'] is None)
-            or (left['wave_direction'] is not None and right['wave_direction'] is None))
+    return ((left.dominant_period is not None and right.dominant_period is None)
+            or (left.average_period is not None and right.average_period is None)
+            or (left.wave_direction is not None and right.wave_direction is None))
+
+
+def add_time_keys(record):
+    date = datetime.datetime(
+        record.year,
+        record.month,
+        record.day,
+        record.hour,
+        record.minute,
+        tzinfo=datetime.timezone.utc)
+
+    record.time = date.strftime('%Y%m%d%H')
+    record.year_month = date.strftime('%Y%m')
+    record.month_day = date.strftime('%m%d')
 
 
 def normalize(records):
+    """
+    Add time keys to records and return array of reason codes, one per record.
+    Records with a reason code other than REASON_NONE are to be filtered out.
+    """
+    reasons = bytearray(len(records))
     index = {}
-    for record in records:
+    for n, record in enumerate(records):
         if has_bad_date(record):
-            record['reason'] = 'bad_date'
+            reasons[n] = REASON_BAD_DATE
             continue
 
-        date = datetime.datetime(
-            record['year'],
-            record['month'],
-            record['day'],
-            record['hour'],
-            record['minute'],
-            tzinfo=pytz.utc)
-
-        date_time = date.strftime('%Y%m%d%H')
-        year_month = date.strftime('%Y%m')
-        month_day = date.strftime('%m%d')
+        add_time_keys(record)
+        date_time = record.time
 
-        record['time'] = date_time
-        record['year_month'] = year_month
-        record['month_day'] = month_day
-
-        if record['wave_height'] is None:
-            record['reason'] = 'no_wave_height'
+        if record.wave_height is None:
+            reasons[n] = REASON_NO_WAVE_HEIGHT
             continue
 
         prior = index.get(date_time)
-        if prior:
-            if has_more_info_than(record, prior):
-                prior['reason'] = 'dup_time'
+        if prior is not None:
+            if has_more_info_than(record, records[prior]):
+                reasons[prior] = REASON_DUP_TIME
             else:
-                record['reason'] = 'dup_time'
+                reasons[n] = REASON_DUP_TIME
                 continue
 
-        index[date_time] = record
+        index[date_time] = n
 
-    return records
+    return reasons
+
+
+def normalize_stream(records, window=NORMALIZE_WINDOW):
+    """
+    Generate normalized records that pass normalization, equivalent to normalize followed by filtering.
+    Duplicate time keys are resolved among the most recent window of distinct time keys,
+    which covers observation files since they are ordered by time.
+    """
+    pending = OrderedDict()
+    flushed = OrderedDict()
+    total = 0
+    retained = 0
+    for record in records:
+        total += 1
+        if has_bad_date(record):
+            continue
+
+        add_time_keys(record)
+        date_time = record.time
+
+        if record.wave_height is None or date_time in flushed:
+            continue
+
+        prior = pending.get(date_time)
+        if prior is not None:
+            if not has_more_info_than(record, prior):
+                continue
+            del pending[date_time]
+
+        pending[date_time] = record
+
+        if len(pending) > window:
+            date_time, record = pending.popitem(last=False)
+            flushed[date_time] = True
+            if len(flushed) > window:
+                flushed.popitem(last=False)
+            retained += 1
+            yield record
+
+    for record in pending.values():
+        retained += 1
+        yield record
+
+    logger.info(f'{retained} of {total} records retained')
 
 
 def is_complete(record):
-    return all((record[name] for name in ['wave_direction', 'dominant_period', 'average_period']))
+    return all((record.wave_direction, record.dominant_period, record.average_period))
 
 
-def filter_and_log(records, retain_partial=False):
+def filter_and_log(records, reasons, retain_partial=False):
     filtered = []
+    debug = logger.isEnabledFor(logging.DEBUG)
     for n, record in enumerate(records):
-        logger.debug(f'record {n + 1}: {record}')
-        if 'reason' not in record:
+        if debug:
+            logger.debug(f'record {n + 1}: {record}, reason: {REASON_NAMES[reasons[n]]}')
+        if reasons[n] == REASON_NONE:
             if retain_partial or is_complete(record):
                 filtered.append(record)
     logging.info(f'{len(filtered)} of {len(records)} records retained')
@@ -154,8 +207,14 @@ def filter_and_log(records, retain_partial=False):
 
 
 def parse_normalize_filter(data):
-    return filter_and_log(normalize(parse_data(data)), True)
+    records = parse_data(data)
+    return filter_and_log(records, normalize(records), True)
+
+
+def parse_normalize_filter_stream(lines):
+    return normalize_stream(parse_lines(lines))
 
 
 def parse_normalize_filter_complete(data):
-    return filter_and_log(normalize(parse_data(data)), False)
+    records = parse_data(data)
+    return filter_and_log(records, normalize(records), False)
@@ -0,0 +1,205 @@
+import calendar
+import logging
+import sys
+import numpy as np
+from buoy.lib import parse
+from buoy.lib.observation import Observation
+
+logger = logging.getLogger(__name__)
+
+MISSING_TOKENS = ['MM', '']
+
+
+def read_table(data):
+    """
+    Split observation text into header list and two-dimensional array of string tokens.
+    Short rows are padded with empty tokens and long rows are truncated to the header width.
+    """
+    lines = data.splitlines()
+    header_line = lines[0]
+    headers = header_line.split()
+    width = len(headers)
+    rows = [line.split() for line in lines[2 if header_line.startswith('#') else 1:]]
+    if any(len(row) != width for row in rows):
+        rows = [(row + [''] * width)[:width] for row in rows]
+    if not rows:
+        return headers, np.empty((0, width), dtype=str)
+    return headers, np.array(rows, dtype=str)
+
+
+def int_column(table, index, range):
+    """
+    Convert token column to integer array and validity mask. Equivalent to parse.parse_int for each row.
+    """
+    if index is None:
+        return np.zeros(len(table), dtype=np.int64), np.zeros(len(table), dtype=bool)
+    column = table[:, index]
+    valid = np.char.isdigit(column)
+    values = np.where(valid, column, '0').astype(np.int64)
+    valid &= (values >= range[0]) & (values <= range[1])
+    return values, valid
+
+
+def float_column(table, index, range):
+    """
+    Convert token column to float array and validity mask. Equivalent to parse.parse_float for each row.
+    """
+    if index is None:
+        return np.zeros(len(table)), np.zeros(len(table), dtype=bool)
+    column = table[:, index]
+    column = np.where(np.isin(column, MISSING_TOKENS), 'nan', column)
+    try:
+        values = column.astype(np.float64)
+    except ValueError:
+        values = np.array([parse.parse_value([token], 0, float, (-np.inf, np.inf)) for token in column], dtype=float)
+    valid = (values >= range[0]) & (values <= range[1])
+    return values, valid
+
+
+def parse_columns(data):
+    """
+    Parse observation text into dictionary of typed column arrays and validity masks.
+    Mirrors parse.parse_data row semantics, including year and minute normalization.
+    """
+    headers, table = read_table(data)
+
+    def index(name):
+        return parse.column_index_of(headers, name)
+
+    year_short, year_short_ok = int_column(table, index('YY'), (70, 98))
+    year_long1, year_long1_ok = int_column(table, index('YYYY'), (1970, 2070))
+    year_long2, year_long2_ok = int_column(table, index('#YY'), (1970, 2070))
+    month, month_ok = int_column(table, index('MM'), (1, 12))
+    day, day_ok = int_column(table, index('DD'), (1, 31))
+    hour, hour_ok = int_column(table, index('hh'), (0, 23))
+    minute, minute_ok = int_column(table, index('mm'), (0, 59))
+
+    return {
+        'year': (np.where(year_short_ok, year_short + 1900, np.where(year_long1_ok, year_long1, year_long2)),
+                 year_short_ok | year_long1_ok | year_long2_ok),
+        'month': (month, month_ok),
+        'day': (day, day_ok),
+        'hour': (hour, hour_ok),
+        'minute': (np.where(minute_ok, minute, 0), np.ones(len(table), dtype=bool)),
+        'wave_height': float_column(table, index('WVHT'), (0, 98)),
+        'wave_direction': float_column(table, index('MWD'), (0, 360)),
+        'dominant_period': float_column(table, index('DPD'), (0, 98)),
+        'average_period': float_column(table, index('APD'), (0, 98))
+    }
+
+
+def days_in_month(year, month):
+    """
+    Number of days in month for arrays of year and month.
+    """
+    days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[month]
+    leap = np.array([calendar.isleap(y) for y in range(1970, 2071)])[np.clip(year, 1970, 2070) - 1970]
+    return days + ((month == 2) & leap)
+
+
+def normalize_mask(columns):
+    """
+    Compute mask of rows retained by parse.normalize and array of time keys as integers YYYYMMDDHH.
+    """
+    year, year_ok = columns['year']
+    month, month_ok = columns['month']
+    day, day_ok = columns['day']
+    hour, hour_ok = columns['hour']
+
+    dated = year_ok & month_ok & day_ok & hour_ok
+    if np.any(dated & (day > days_in_month(year, np.where(month_ok, month, 1)))):
+        raise ValueError('day is out of range for month')
+
+    times = year * 1000000 + month * 10000 + day * 100 + hour
+    keep = dated & columns['wave_height'][1]
+
+    candidates = np.flatnonzero(keep)
+    unique, counts = np.unique(times[candidates], return_counts=True)
+    if np.any(counts > 1):
+        more_info = [columns[name][1] for name in ['dominant_period', 'average_period', 'wave_direction']]
+        duplicates = set(unique[counts > 1].tolist())
+        index = {}
+        for n in candidates.tolist():
+            time = int(times[n])
+            if time not in duplicates:
+                continue
+            prior = index.get(time)
+            if prior is not None:
+                if any(ok[n] and not ok[prior] for ok in more_info):
+                    keep[prior] = False
+                else:
+                    keep[n] = False
+                    continue
+            index[time] = n
+
+    return keep, times
+
+
+def complete_mask(columns):
+    """
+    Compute mask of rows satisfying parse.is_complete.
+    """
+    mask = np.ones(len(columns['year'][0]), dtype=bool)
+    for name in ['wave_direction', 'dominant_period', 'average_period']:
+        values, ok = columns[name]
+        mask &= ok & (values != 0)
+    return mask
+
+
+def make_records(columns, times, rows):
+    """
+    Make list of observation records for selected row indices, identical to normalized parse.parse_data records.
+    """
+    lists = []
+    for values, ok in columns.values():
+        lists.append([v if o else None for v, o in zip(values[rows].tolist(), ok[rows].tolist())])
+    time_keys = times[rows].astype(str).tolist()
+    month_days = np.char.zfill((times[rows] // 100 % 10000).astype(str), 4).tolist()
+    records = []
+    for n, values in enumerate(zip(*lists)):
+        record = Observation(*values)
+        record.time = time_keys[n]
+        record.year_month = record.time[:6]
+        record.month_day = month_days[n]
+        records.append(record)
+    return records
+
+
+def _parse_normalize_filter(data, retain_partial):
+    columns = parse_columns(data)
+    keep, times = normalize_mask(columns)
+    if not retain_partial:
+        keep &= complete_mask(columns)
+    records = make_records(columns, times, np.flatnonzero(keep))
+    logger.info(f'{len(records)} of {len(times)} records retained')
+    return records
+
+
+def parse_normalize_filter(data):
+    """
+    Vectorized equivalent of parse.parse_normalize_filter.
+    """
+    return _parse_normalize_filter(data, True)
+
+
+def parse_normalize_filter_complete(data):
+    """
+    Vectorized equivalent of parse.parse_normalize_filter_complete.
+    """
+    return _parse_normalize_filter(data, False)
+
+
+def add_arguments(parser):
+    """
+    Add parser backend command line option to argument parser.
+    """
+    parser.add_argument('--parser', help="Observation parser backend. The vectorized parsevec backend parses whole "
+                                         "files, so loads that otherwise stream year files run a pipelined backfill",
+                        choices=['parse', 'parsevec'], default='parse')
+
+
+def from_args(args):
+    """
+    Module providing parse_normalize_filter and parse_normalize_filter_complete for the selected parser backend.
+    """
+    return sys.modules[__name__] if args.parser == 'parsevec' else parse
@@ -0,0 +1,110 @@
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# estimated memory per cached value, a list slot plus a float object
+VALUE_BYTES = 32
+
+# logged name of each lookup outcome counter
+OUTCOMES = {'hits': 'hit', 'misses': 'miss'}
+
+
+class _Entry:
+    __slots__ = ('values', 'watermark', 'lock')
+
+    def __init__(self, values, watermark):
+        self.values = values
+        self.watermark = watermark
+        self.lock = threading.Lock()
+
+
+class QueryCache:
+    """
+    In-memory cache of sorted wave height lists, meant to be kept at module level so it survives
+    warm Lambda invocations. Each entry records a watermark time key, up to which its values are complete.
+    A hit is brought up to date by merging in only the values of items newer than the watermark.
+    Observations rewritten in place, without a newer time key, are not picked up.
+    Least recently used entries are evicted when the estimated size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'read': 0, 'served': 0}
+
+    def get(self, key, load, refresh, fn):
+        """
+        Apply function to the up-to-date sorted value list of key and return the result.
+        On a miss, load() returns the watermark and an iterable of (time key, value) pairs of all values up to it.
+        On a hit, refresh(watermark) returns the new watermark and an iterable of (time key, value) pairs
+        newer than the old one.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        if entry is None:
+            watermark, pairs = load()
+            pairs = list(pairs)
+            entry = _Entry(sorted(value for _, value in pairs), watermark)
+            self._add(key, entry)
+            with entry.lock:
+                return self._apply(key, 'misses', pairs, entry, fn)
+
+        with entry.lock:
+            watermark, pairs = refresh(entry.watermark)
+            pairs = list(pairs)
+            for _, value in pairs:
+                bisect.insort(entry.values, value)
+            entry.watermark = max(entry.watermark, watermark)
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    self.size += len(pairs) * VALUE_BYTES
+            return self._apply(key, 'hits', pairs, entry, fn)
+
+    def _apply(self, key, outcome, pairs, entry, fn):
+        """
+        Count outcome of lookup, log counters and apply function to entry values.
+        """
+        with self.lock:
+            self.stats[outcome] += 1
+            self.stats['read'] += len(pairs)
+            self.stats['served'] += len(entry.values) - len(pairs)
+            stats = dict(self.stats)
+        logger.info(f'query cache {OUTCOMES[outcome]} for {key}: read {len(pairs)} values, {len(entry.values)} cached; '
+                    f'hits {stats["hits"]}, misses {stats["misses"]}, evictions {stats["evictions"]}, '
+                    f'values read {stats["read"]}, values served without reading {stats["served"]}')
+        return fn(entry.values)
+
+    def _add(self, key, entry):
+        """
+        Add entry and evict least recently used entries, other than the new one, until within size bounds.
+        """
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous:
+                self.size -= len(previous.values) * VALUE_BYTES
+            self.entries[key] = entry
+            self.size += len(entry.values) * VALUE_BYTES
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.values) * VALUE_BYTES
+                self.stats['evictions'] += 1
+                logger.debug(f'evicted {evicted_key} from query cache')
+
+
+def percentile(values, value):
+    """
+    Calculate percentile of input value among sorted list of values, as dbquery.percentile does.
+    """
+    cnt = bisect.bisect_right(values, value)
+    per = int(cnt / len(values) * 100) if values else 0
+    return per, cnt, len(values)
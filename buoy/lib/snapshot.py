@@ -0,0 +1,196 @@
+import os
+import json
+import shutil
+import logging
+import datetime
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MISSING = -1
+
+# names the generation directory holding the current column files, with their row count
+MANIFEST_FILE = 'manifest.json'
+
+GENERATION_PREFIX = 'gen-'
+
+# column name, array type, scale applied to stored number
+COLUMNS = [
+    ('time', np.uint32, None),
+    ('minute', np.int8, None),
+    ('waveheight', np.int16, 100),
+    ('wavedir', np.int16, 10),
+    ('domperiod', np.int16, 100),
+    ('avgperiod', np.int16, 100)
+]
+
+
+class Snapshot:
+    """
+    Columnar snapshot of the observation history of a buoy. Each column is a fixed-width array stored
+    in its own .npy file and opened with mmap. Rows are in time key order.
+    Scaled columns hold integer multiples of their unit, with -1 for missing values.
+    Every save writes a new generation directory and then replaces the manifest naming it, so a crash
+    leaves either the old or the new set of columns. The manifest holds the row count, which is checked on open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = None
+        self.columns = self._open()
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def _manifest_file(self):
+        return os.path.join(self.path, MANIFEST_FILE)
+
+    def _generation_dir(self, generation):
+        return os.path.join(self.path, f'{GENERATION_PREFIX}{generation}')
+
+    def _column_file(self, generation, name):
+        return os.path.join(self._generation_dir(generation), f'{name}.npy')
+
+    def _open(self):
+        """
+        Open column arrays of the current generation with mmap, or make empty column arrays if no snapshot has
+        been saved or its columns do not all hold the row count of the manifest.
+        """
+        empty = {name: np.empty(0, dtype=dtype) for name, dtype, _ in COLUMNS}
+        try:
+            with open(self._manifest_file()) as f:
+                manifest = json.load(f)
+            self.generation = manifest['generation']
+            columns = {name: np.load(self._column_file(self.generation, name), mmap_mode='r')
+                       for name, _, _ in COLUMNS}
+        except FileNotFoundError:
+            return empty
+        lengths = {name: len(column) for name, column in columns.items()}
+        if any(length != manifest['rows'] for length in lengths.values()):
+            logger.warning(f'discarding snapshot {self.path}, column lengths {lengths} differ from '
+                           f'{manifest["rows"]} rows in manifest')
+            return empty
+        return columns
+
+    def _save(self, columns):
+        """
+        Save column arrays into a new generation directory, point the manifest at it and remove older generations.
+        """
+        generation = (self.generation or 0) + 1
+        directory = self._generation_dir(generation)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        for name, _, _ in COLUMNS:
+            np.save(self._column_file(generation, name), columns[name])
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'generation': generation, 'rows': len(columns['time'])}, f)
+        os.replace(tmp, self._manifest_file())
+        self.generation = generation
+        for entry in os.listdir(self.path):
+            if entry.startswith(GENERATION_PREFIX) and entry != os.path.basename(directory):
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def high_water(self):
+        """
+        Time key of most recent row in snapshot or None if snapshot is empty.
+        """
+        times = self.columns['time']
+        return str(int(times[-1])) if len(times) else None
+
+    def refresh(self, db, window=0):
+        """
+        Append rows for items newer than the high-water time key and reopen snapshot.
+        Items updated in place, such as those enriched by upsert, are only picked up within a trailing window
+        of hours before the high-water time key, whose rows are read again and replaced.
+        """
+        high_water = self.high_water()
+        after = _hours_before(high_water, window) if high_water and window else high_water
+        rows = [decode(item) for item in db.query_items_after(after or '0')]
+        logger.info(f'refreshing snapshot of {len(self)} rows with {len(rows)} rows after {after}')
+        if not rows:
+            return
+        keep = int(np.searchsorted(self.columns['time'], int(after), side='right')) if after else 0
+        delta = {name: np.array([row[n] for row in rows], dtype=dtype) for n, (name, dtype, _) in enumerate(COLUMNS)}
+        self._save({name: np.concatenate((self.columns[name][:keep], delta[name])) for name, _, _ in COLUMNS})
+        self.columns = self._open()
+
+    def _month_mask(self, month):
+        return (self.columns['time'] // 10000) % 100 == month
+
+    def _month_day_mask(self, month_day):
+        return (self.columns['time'] // 100) % 10000 == int(month_day)
+
+    def _percentile(self, mask, wave_height):
+        values = self.columns['waveheight'][mask]
+        cnt = int(np.count_nonzero(values <= round(wave_height * 100)))
+        per = int(cnt / len(values) * 100) if len(values) else 0
+        return per, cnt, len(values)
+
+    def month_percentile(self, month, wave_height):
+        """
+        Calculate percentile of input value among wave heights for a given month.
+        """
+        return self._percentile(self._month_mask(month), wave_height)
+
+    def month_day_percentile(self, month_day, wave_height):
+        """
+        Calculate percentile of input value among wave heights for a given month-day.
+        """
+        return self._percentile(self._month_day_mask(month_day), wave_height)
+
+    def find_max_wave_height(self):
+        """
+        Find the most recent row with the maximum wave height ever recorded.
+        """
+        heights = self.columns['waveheight']
+        if not len(heights):
+            return
+        return self._item(len(heights) - 1 - int(np.argmax(heights[::-1])))
+
+    def find_last_occurrence_of(self, wave_height):
+        """
+        Find the most recent row with a wave height greater than the input wave height.
+        """
+        indices = np.flatnonzero(self.columns['waveheight'] > round(wave_height * 100))
+        if len(indices):
+            return self._item(int(indices[-1]))
+
+    def _item(self, index):
+        """
+        Make DynamoDB table item dictionary from snapshot row.
+        """
+        time = str(int(self.columns['time'][index]))
+        item = {
+            'time': {'S': time},
+            'year': {'N': str(int(time[0:4]))},
+            'month': {'N': str(int(time[4:6]))},
+            'day': {'N': str(int(time[6:8]))},
+            'hour': {'N': str(int(time[8:10]))},
+            'minute': {'N': str(int(self.columns['minute'][index]))}
+        }
+        for name, _, scale in COLUMNS:
+            if scale:
+                value = int(self.columns[name][index])
+                if value != MISSING:
+                    item[name] = {'N': str(value / scale)}
+        return item
+
+
+def _hours_before(time, hours):
+    """
+    Time key the input number of hours before input time key.
+    """
+    moment = datetime.datetime.strptime(time, '%Y%m%d%H') - datetime.timedelta(hours=hours)
+    return moment.strftime('%Y%m%d%H')
+
+
+def decode(item):
+    """
+    Decode DynamoDB table item dictionary to tuple of column values.
+    """
+    row = [int(item['time']['S']), int(item['minute']['N']) if 'minute' in item else 0]
+    for name, _, scale in COLUMNS[2:]:
+        row.append(round(float(item[name]['N']) * scale) if name in item else MISSING)
+    return row
@@ -0,0 +1,223 @@
+import logging
+import sqlite3
+import itertools
+import threading
+from buoy.lib import parse
+from buoy.lib import storage
+from buoy.lib.observation import Observation
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 10000
+
+# column name, item attribute name and type
+COLUMNS = [
+    ('id', 'id', 'S'),
+    ('time', 'time', 'S'),
+    ('minute', 'minute', 'N'),
+    ('month', 'month', 'N'),
+    ('monthday', 'monthday', 'S'),
+    ('waveheight', 'waveheight', 'N'),
+    ('wavedir', 'wavedir', 'N'),
+    ('domperiod', 'domperiod', 'N'),
+    ('avgperiod', 'avgperiod', 'N')
+]
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS observations (
+        id TEXT NOT NULL,
+        time TEXT NOT NULL,
+        minute INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        monthday TEXT NOT NULL,
+        waveheight REAL NOT NULL,
+        wavedir REAL,
+        domperiod REAL,
+        avgperiod REAL,
+        PRIMARY KEY (id, time)
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS observations_month ON observations (id, month, waveheight)',
+    'CREATE INDEX IF NOT EXISTS observations_monthday ON observations (id, monthday, waveheight)'
+]
+
+SELECT_COLUMNS = ', '.join(name for name, _, _ in COLUMNS)
+
+INSERT = f'INSERT OR REPLACE INTO observations ({SELECT_COLUMNS}) VALUES ({", ".join("?" * len(COLUMNS))})'
+
+
+class SqliteDb(storage.Storage):
+    """
+    Observation store of one buoy in a local SQLite database file, which may hold several buoys.
+    Observations are rows keyed by (id, time), with covering indexes on (id, month) and (id, monthday)
+    that include the wave height. Queries are answered with SQL aggregation and ordered index scans,
+    so no histogram, max index or summary items are kept. The connection is shared by threads under a lock.
+    """
+
+    def __init__(self, path, buoy):
+        self.path = path
+        self.buoy = buoy
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _insert(self, records):
+        rows = [self._convert_row(record) for record in records]
+        with self.lock, self.connection:
+            self.connection.executemany(INSERT, rows)
+        logger.info(f'wrote {len(rows)} rows into {self.path}')
+
+    def write(self, records):
+        """
+        Write list of observation records as rows.
+        """
+        self._insert(records)
+
+    def write_conditional(self, records):
+        """
+        Write list of observation records as rows. There are no index items to write conditionally.
+        """
+        self._insert(records)
+
+    def upsert(self, records):
+        """
+        Write list of observation records as rows, skipping records whose rows are already stored
+        with at least as much information.
+        """
+        existing = self._find_existing(records)
+        changed = [record for record in records if self._has_more_info_than_existing(record, existing)]
+        logger.info(f'skipping {len(records) - len(changed)} of {len(records)} records already stored')
+        self._insert(changed)
+
+    def _has_more_info_than_existing(self, record, existing):
+        """
+        Determine whether observation record is new or has more information than its stored row,
+        applying parse.has_more_info_than to the stored form of both, as DynamoDB upsert does.
+        """
+        stored = existing.get(record.time)
+        if not stored:
+            return True
+        return parse.has_more_info_than(_row_observation(self._convert_row(record)), stored)
+
+    def write_stream(self, records, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Write iterable of observation records as rows, one chunk per transaction.
+        """
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            self._insert(chunk)
+
+    def _find_existing(self, records):
+        """
+        Find rows already stored in the time range covered by list of observation records.
+        Result is a dictionary of time key to observation record holding the stored wave attributes.
+        """
+        if not records:
+            return {}
+        rows = self._execute(
+            f'SELECT {SELECT_COLUMNS} FROM observations WHERE id = ? AND time BETWEEN ? AND ?',
+            (self.buoy, min(record.time for record in records), max(record.time for record in records)))
+        return {row[1]: _row_observation(row) for row in rows}
+
+    def _convert_row(self, record):
+        """
+        Make row tuple from observation record. Empty optional values are stored as NULL, as they are
+        left out of DynamoDB items.
+        """
+        return (self.buoy, record.time, record.minute, record.month, record.month_day, record.wave_height,
+                record.wave_direction or None, record.dominant_period or None, record.average_period or None)
+
+    def _select_item(self, where, params, order=''):
+        rows = self._execute(f'SELECT {SELECT_COLUMNS} FROM observations WHERE id = ? AND {where} {order} LIMIT 1',
+                             (self.buoy, *params))
+        return _row_item(rows[0]) if rows else None
+
+    def find_latest(self):
+        """
+        Find the most recent row by scanning the primary key backward.
+        """
+        return self._select_item('1', (), 'ORDER BY time DESC')
+
+    def find_max_wave_height(self):
+        """
+        Find the earliest row with the maximum wave height, as the DynamoDB summary item keeps it.
+        """
+        return self._select_item(
+            'waveheight = (SELECT MAX(waveheight) FROM observations WHERE id = ?)', (self.buoy,), 'ORDER BY time')
+
+    def find_last_occurrence_of(self, wave_height):
+        """
+        Find the most recent row with a wave height greater than the input wave height by scanning
+        the primary key backward.
+        """
+        return self._select_item('waveheight > ?', (wave_height,), 'ORDER BY time DESC')
+
+    def query_month(self, month):
+        rows = self._execute('SELECT waveheight FROM observations WHERE id = ? AND month = ? ORDER BY waveheight',
+                             (self.buoy, month))
+        return [row[0] for row in rows]
+
+    def query_month_day(self, month_day):
+        rows = self._execute('SELECT waveheight FROM observations WHERE id = ? AND monthday = ? ORDER BY waveheight',
+                             (self.buoy, month_day))
+        return [row[0] for row in rows]
+
+    def query_month_percentile(self, month, wave_height):
+        """
+        Count wave heights at or below input value for a given month in one aggregation over the month index.
+        """
+        return self._percentile('month', month, wave_height)
+
+    def query_month_day_percentile(self, month_day, wave_height):
+        """
+        Count wave heights at or below input value for a given month-day in one aggregation over the month-day index.
+        """
+        return self._percentile('monthday', month_day, wave_height)
+
+    def _percentile(self, column, key, wave_height):
+        [(cnt, total)] = self._execute(
+            f'SELECT TOTAL(waveheight <= ?), COUNT(*) FROM observations WHERE id = ? AND {column} = ?',
+            (wave_height, self.buoy, key))
+        cnt = int(cnt)
+        per = int(cnt / total * 100) if total else 0
+        return per, cnt, total
+
+    def query_items_after(self, time):
+        rows = self._execute(f'SELECT {SELECT_COLUMNS} FROM observations WHERE id = ? AND time > ? ORDER BY time',
+                             (self.buoy, time))
+        return (_row_item(row) for row in rows)
+
+
+def _row_observation(row):
+    """
+    Make observation record holding the wave attributes of a row tuple.
+    """
+    return Observation(None, None, None, None, None, *row[5:])
+
+
+def _row_item(row):
+    """
+    Make DynamoDB-style item dictionary from row tuple, with the same attributes as a DynamoDB table item.
+    """
+    item = {}
+    for (_, attribute, kind), value in zip(COLUMNS, row):
+        if value is not None:
+            item[attribute] = {kind: str(value)}
+    time = item['time']['S']
+    item['year'] = {'N': str(int(time[:4]))}
+    item['day'] = {'N': str(int(time[6:8]))}
+    item['hour'] = {'N': str(int(time[8:10]))}
+    item['yearmonth'] = {'S': time[:6]}
+    return item
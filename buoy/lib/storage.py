@@ -0,0 +1,101 @@
+import abc
+
+
+class Storage(abc.ABC):
+    """
+    Observation store of one buoy. Writes take lists or iterables of observation records from parse.py.
+    Queries return items as DynamoDB attribute value dictionaries with the attributes described in the README,
+    such as {'time': {'S': '2023010112'}, 'waveheight': {'N': '1.5'}, ...}, whatever the backend.
+    Percentiles are (percent, count at or below value, total count) tuples.
+    """
+
+    snapshot = None
+
+    @abc.abstractmethod
+    def write(self, records):
+        """
+        Write list of observation records.
+        """
+
+    @abc.abstractmethod
+    def write_conditional(self, records):
+        """
+        Write list of new observation records, as the Lambda function does every invocation.
+        """
+
+    @abc.abstractmethod
+    def upsert(self, records):
+        """
+        Write list of observation records, skipping records already stored with at least as much information.
+        """
+
+    @abc.abstractmethod
+    def write_stream(self, records):
+        """
+        Write iterable of observation records, holding a bounded number of them in memory at a time.
+        """
+
+    @abc.abstractmethod
+    def find_latest(self):
+        """
+        Find the most recent item, or None if there are none.
+        """
+
+    @abc.abstractmethod
+    def find_max_wave_height(self):
+        """
+        Find the item with the maximum wave height ever recorded, or None if there are none.
+        """
+
+    @abc.abstractmethod
+    def find_last_occurrence_of(self, wave_height):
+        """
+        Find the most recent item with a wave height greater than input wave height, or None if there are none.
+        """
+
+    @abc.abstractmethod
+    def query_month(self, month):
+        """
+        Obtain all wave height values for a given month and return in sorted list ascending.
+        """
+
+    @abc.abstractmethod
+    def query_month_day(self, month_day):
+        """
+        Obtain all wave height values for a given month-day and return in sorted list ascending.
+        """
+
+    @abc.abstractmethod
+    def query_month_percentile(self, month, wave_height):
+        """
+        Calculate percentile of input value among wave heights for a given month.
+        Result is (percentile, count at or below value, total count), or (0, 0, 0) if there are no observations.
+        """
+
+    @abc.abstractmethod
+    def query_month_day_percentile(self, month_day, wave_height):
+        """
+        Calculate percentile of input value among wave heights for a given month-day.
+        Result is (percentile, count at or below value, total count), or (0, 0, 0) if there are no observations.
+        """
+
+    @abc.abstractmethod
+    def query_items_after(self, time):
+        """
+        Generate all items with time key greater than input time key in ascending order.
+        """
+
+
+def add_arguments(parser):
+    """
+    Add storage backend command line options to argument parser.
+    """
+    parser.add_argument('--sqlite', help="SQLite database file to use instead of a DynamoDB table")
+
+
+def check_arguments(parser, args):
+    """
+    Exit with a usage error unless a DynamoDB table and region or a SQLite database file are given.
+    """
+    if not args.sqlite and not (args.table and args.region):
+        parser.error('--table and --region are required unless --sqlite is given')
@@ -0,0 +1,44 @@
+SUMMARY = 'summary'
+
+
+def empty():
+    return {'count': 0, 'first': None, 'latest': None, 'max': None}
+
+
+def compute(records, existing):
+    """
+    Summarize list of observation records into number of records new to the table, earliest record, latest record
+    and record with maximum wave height. Input existing is a collection of time keys already stored.
+    """
+    summary = empty()
+    for record in records:
+        if record.time not in existing:
+            summary['count'] += 1
+        _merge_record(summary, record)
+    return summary
+
+
+def merge(summary, other):
+    """
+    Merge summary into another summary in place.
+    """
+    summary['count'] += other['count']
+    for name in ['first', 'latest', 'max']:
+        if other[name] and _improves(name, other[name], summary[name]):
+            summary[name] = other[name]
+
+
+def _merge_record(summary, record):
+    for name in ['first', 'latest', 'max']:
+        if _improves(name, record, summary[name]):
+            summary[name] = record
+
+
+def _improves(name, record, current):
+    if current is None:
+        return True
+    if name == 'first':
+        return record.time < current.time
+    if name == 'latest':
+        return record.time > current.time
+    return record.wave_height > current.wave_height
@@ -0,0 +1,91 @@
+import math
+import random
+import datetime
+
+# header formats used by NOAA historical standard meteorological files over the years
+HEADER_YY = 'YY MM DD hh WD   WSPD GST  WVHT  DPD   APD  MWD  BAR    ATMP  WTMP  DEWP  VIS'
+HEADER_YYYY = 'YYYY MM DD hh WD   WSPD GST  WVHT   DPD   APD MWD  BAR    ATMP  WTMP  DEWP  VIS  TIDE'
+HEADER_YYYY_MINUTE = 'YYYY MM DD hh mm  WD  WSPD GST  WVHT   DPD   APD MWD   BAR    ATMP  WTMP  DEWP  VIS  TIDE'
+HEADER_HASH_YY = '#YY  MM DD hh mm WDIR WSPD GST  WVHT   DPD   APD MWD   PRES  ATMP  WTMP  DEWP  VIS  TIDE'
+UNITS_HASH_YY = '#yr  mo dy hr mn degT m/s  m/s     m   sec   sec degT   hPa  degC  degC  degC  nmi    ft'
+
+FIRST_YYYY_YEAR = 1999
+FIRST_MINUTE_YEAR = 2005
+FIRST_HASH_YY_YEAR = 2007
+
+MISSING_RATE = 0.03
+DUPLICATE_RATE = 0.002
+
+
+def header_lines(year):
+    """
+    Header lines of a historical file for input year, in the format NOAA used that year.
+    """
+    if year < FIRST_YYYY_YEAR:
+        return [HEADER_YY]
+    if year < FIRST_MINUTE_YEAR:
+        return [HEADER_YYYY]
+    if year < FIRST_HASH_YY_YEAR:
+        return [HEADER_YYYY_MINUTE]
+    return [HEADER_HASH_YY, UNITS_HASH_YY]
+
+
+def observations(year, seed=None):
+    """
+    Generate (time, wave height, dominant period, average period, direction) tuples for every hour of input year.
+    Wave heights follow a seasonal cycle with random storms, so the maximum and percentiles vary like real data.
+    Missing values are None.
+    """
+    rnd = random.Random(year if seed is None else seed)
+    time = datetime.datetime(year, 1, 1)
+    end = datetime.datetime(year + 1, 1, 1)
+    storm = 0.0
+    while time < end:
+        season = math.cos((time.timetuple().tm_yday - 15) / 365 * 2 * math.pi)
+        if rnd.random() < 0.002:
+            storm = rnd.uniform(1, 6)
+        storm *= 0.97
+        height = max(0.2, 2 + season + storm + rnd.gauss(0, 0.3))
+        period = 8 + 4 * season + rnd.uniform(-2, 2)
+        values = [round(height, 2), round(period, 2), round(period * 0.7, 2), rnd.randrange(200, 330)]
+        for n in range(len(values)):
+            if rnd.random() < MISSING_RATE:
+                values[n] = None
+        yield (time, *values)
+        time += datetime.timedelta(hours=1)
+
+
+def _line(year, time, height, dom_period, avg_period, direction):
+    height = '99.00' if height is None else f'{height:.2f}'
+    dom_period = '99.00' if dom_period is None else f'{dom_period:.2f}'
+    avg_period = '99.00' if avg_period is None else f'{avg_period:.2f}'
+    direction = '999' if direction is None else f'{direction}'
+    weather = f'{height:>5} {dom_period:>5} {avg_period:>5} {direction:>3} 1015.2  13.1  13.4 999.0 99.0'
+    if year < FIRST_YYYY_YEAR:
+        return f'{time:%y %m %d %H} 290  6.1  7.4 {weather}'
+    if year < FIRST_MINUTE_YEAR:
+        return f'{time:%Y %m %d %H} 290  6.1  7.4 {weather} 99.00'
+    return f'{time:%Y %m %d %H %M} 290  6.1  7.4 {weather} 99.00'
+
+
+def year_data(year, seed=None):
+    """
+    Make text of a synthetic NOAA historical standard meteorological file for input year.
+    A small fraction of lines is repeated, as in real files.
+    """
+    rnd = random.Random(year if seed is None else seed)
+    lines = header_lines(year)
+    for observation in observations(year, seed):
+        line = _line(year, *observation)
+        lines.append(line)
+        if rnd.random() < DUPLICATE_RATE:
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def years_data(first_year, count, seed=None):
+    """
+    Generate (year, text) tuples of synthetic historical files for consecutive years.
+    """
+    for year in range(first_year, first_year + count):
+        yield year, year_data(year, None if seed is None else seed + year)
@@ -0,0 +1,212 @@
+import io
+import os
+import time
+import pstats
+import logging
+import cProfile
+import resource
+import threading
+import contextlib
+import contextvars
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# frames kept per allocation traceback when memory profiling
+TRACEMALLOC_FRAMES = 16
+
+# functions and allocation sites logged at the end of a profiled session
+TOP_ENTRIES = 25
+
+# innermost span of the current context
+_current = contextvars.ContextVar('span', default=None)
+
+# profiling session, if any, while one is active
+_profiler = None
+
+
+class Span:
+    """
+    Named stage with wall time, CPU time of the thread that ran it, peak traced memory while profiling,
+    and process peak resident set size at its end. Child spans may run in other threads.
+    """
+
+    __slots__ = ('name', 'parent', 'children', 'wall', 'cpu', 'peak', 'rss')
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak = None
+        self.rss = None
+
+    def stack(self):
+        names = []
+        span = self
+        while span:
+            names.append(span.name.replace(';', ','))
+            span = span.parent
+        return ';'.join(reversed(names))
+
+    def describe(self):
+        text = f'wall {self.wall * 1000:.1f} ms, cpu {self.cpu * 1000:.1f} ms'
+        if self.rss is not None:
+            text += f', peak rss {self.rss:.1f} MB'
+        if self.peak is not None:
+            text += f', peak traced {self.peak / 1024 / 1024:.1f} MB'
+        return text
+
+    def report(self, depth=0):
+        """
+        Generate indented report lines of span and its descendants.
+        """
+        yield f'{"  " * depth}{self.name}: {self.describe()}'
+        for child in list(self.children):
+            yield from child.report(depth + 1)
+
+    def folded(self):
+        """
+        Generate folded stack lines of span and its descendants, weighted by self wall time in microseconds,
+        as read by flamegraph.pl and speedscope.
+        """
+        children = list(self.children)
+        self_time = max(0.0, self.wall - sum(child.wall for child in children))
+        yield f'{self.stack()} {round(self_time * 1_000_000)}'
+        for child in children:
+            yield from child.folded()
+
+
+class _Profiler:
+    """
+    cProfile and tracemalloc capture for the duration of a session. cProfile only sees the thread that enables it,
+    and from Python 3.12 only one profiler may be active per process, so only the session thread is profiled.
+    Spans in other threads still report times and traced memory. If another profiler is already active,
+    cProfile is skipped. Traced memory peaks of spans running concurrently in several threads overlap.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.profile = cProfile.Profile()
+        try:
+            self.profile.enable()
+        except ValueError as e:
+            logger.warning(f'not capturing cProfile data: {e}')
+            self.profile = None
+
+    def enter(self, span):
+        with self.lock:
+            if span.parent:
+                span.parent.peak = max(span.parent.peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+    def exit(self, span):
+        with self.lock:
+            span.peak = max(span.peak or 0, tracemalloc.get_traced_memory()[1])
+
+    def stop(self):
+        if self.profile:
+            self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        return pstats.Stats(self.profile) if self.profile else None, snapshot
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Run the enclosed block as a span nested in the current one, and log its wall and CPU time.
+    """
+    parent = _current.get()
+    current = Span(name, parent)
+    if parent:
+        parent.children.append(current)
+    token = _current.set(current)
+    profiler = _profiler
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        if profiler:
+            profiler.enter(current)
+        yield current
+    finally:
+        current.wall = time.perf_counter() - wall
+        current.cpu = time.thread_time() - cpu
+        current.rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        if profiler:
+            profiler.exit(current)
+        _current.reset(token)
+        logger.info(f'stage {name}: {current.describe()}')
+
+
+def call(name, fn, *args):
+    """
+    Call function with input arguments in a span.
+    """
+    with span(name):
+        return fn(*args)
+
+
+def submit(executor, name, fn, *args):
+    """
+    Submit function call in a span to executor, nested in the current span of the submitting thread.
+    """
+    return executor.submit(contextvars.copy_context().run, call, name, fn, *args)
+
+
+@contextlib.contextmanager
+def session(name, directory=None):
+    """
+    Run the enclosed block as a root span and log the span tree at the end.
+    If a directory is given, also capture cProfile and tracemalloc data while the block runs, log the top functions
+    and allocation sites, and write <name>-<time>.folded span stacks, a .prof pstats file and a .memory.txt
+    allocation report into the directory.
+    """
+    global _profiler
+    profiler = _profiler = _Profiler() if directory else None
+    try:
+        with span(name) as root:
+            yield root
+    finally:
+        _profiler = None
+        for line in root.report():
+            logger.info(f'span {line}')
+        if profiler:
+            _write_profile(name, directory, root, *profiler.stop())
+
+
+def add_arguments(parser):
+    """
+    Add tracing command line options to argument parser.
+    """
+    parser.add_argument('--trace', help="Capture cProfile and tracemalloc data and write profiles into directory")
+
+
+def _write_profile(name, directory, root, stats, snapshot):
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}')
+
+    with open(f'{base}.folded', 'w') as f:
+        f.writelines(f'{line}\n' for line in root.folded())
+
+    files = [f'{base}.folded']
+    if stats:
+        stats.dump_stats(f'{base}.prof')
+        files.append(f'{base}.prof')
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats('cumulative').print_stats(TOP_ENTRIES)
+        logger.info(f'top functions by cumulative time:\n{text.getvalue()}')
+
+    top = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).statistics('lineno')
+    with open(f'{base}.memory.txt', 'w') as f:
+        f.writelines(f'{stat}\n' for stat in top)
+    lines = '\n'.join(str(stat) for stat in top[:TOP_ENTRIES])
+    logger.info(f'top allocation sites of memory still allocated:\n{lines}')
+    files.append(f'{base}.memory.txt')
+    logger.info(f'wrote profiles {", ".join(files)}')
@@ -0,0 +1,28 @@
+import pytest
+from buoy.lib import dynamo
+from buoy.lib import fakedynamo
+from buoy.lib import parse
+from buoy.lib import synthetic
+
+TABLE = 'buoys'
+BUOY = '46013'
+
+
+@pytest.fixture(scope='session')
+def records():
+    """
+    Parsed observation records of three consecutive synthetic years, in time order.
+    """
+    return [record for _, data in synthetic.years_data(2015, 3, seed=1) for record in parse.parse_normalize_filter(data)]
+
+
+@pytest.fixture
+def client():
+    client = fakedynamo.FakeDynamo()
+    fakedynamo.create_buoy_table(client, TABLE)
+    return client
+
+
+@pytest.fixture
+def db(client):
+    return dynamo.Dynamo(client, TABLE, BUOY)
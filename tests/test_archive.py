@@ -0,0 +1,40 @@
+from buoy.lib import archive
+from buoy.lib import dynamo
+from buoy.lib import fakedynamo
+from buoy.lib import snapshot
+from buoy.lib import sqlitedb
+from conftest import BUOY
+
+
+def _rows(db):
+    return [snapshot.decode(item) for item in db.query_items_after('0')]
+
+
+def test_export_import_round_trip(tmp_path, client, db, records):
+    db.write_stream(records)
+    db.rebuild_histograms()
+    db.rebuild_summary()
+    path = tmp_path / 'export.npz'
+    assert archive.export(db, path) == (len(records), 36)
+
+    fakedynamo.create_buoy_table(client, 'imported')
+    target = dynamo.Dynamo(client, 'imported', BUOY)
+    assert archive.load(target, path) == len(records)
+
+    assert list(target.query_items_after('0')) == list(db.query_items_after('0'))
+    for level, _ in dynamo.INDEX_LEVELS:
+        assert list(target.query_index_items(level)) == list(db.query_index_items(level))
+    assert target.get_summary() == db.get_summary()
+    assert [target.query_month_percentile(month, 2.0) for month in range(1, 13)] == \
+           [db.query_month_percentile(month, 2.0) for month in range(1, 13)]
+
+
+def test_export_import_into_sqlite(tmp_path, db, records):
+    db.write_stream(records)
+    path = tmp_path / 'export.npz'
+    archive.export(db, path)
+
+    target = sqlitedb.SqliteDb(str(tmp_path / 'buoys.db'), BUOY)
+    archive.load(target, path)
+    assert _rows(target) == _rows(db)
+    target.close()
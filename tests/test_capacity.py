@@ -0,0 +1,28 @@
+import datetime
+import pytest
+from buoy.lib import capacity
+from buoy.lib import dynamo
+from conftest import TABLE, BUOY
+
+NOW = datetime.datetime(2020, 1, 1)
+
+
+@pytest.mark.parametrize('built', [False, True], ids=['legacy', 'rebuilt'])
+def test_plan_bounds_write_stream_capacity(client, records, built):
+    db = dynamo.Dynamo(client, TABLE, BUOY)
+    db.write_stream([record for record in records if record.year == 2015])
+    if built:
+        db.rebuild_histograms()
+        db.rebuild_summary()
+        db.rebuild_index()
+
+    db = dynamo.Dynamo(client, TABLE, BUOY)
+    assert db.aggregates_built() == (built, built)
+    client.reset_stats()
+    for year in [2016, 2017]:
+        db.write_stream([record for record in records if record.year == year])
+    estimate = capacity.plan([(2016, None), (2017, None)], None, None, dynamo.STREAM_CHUNK_SIZE, built, built, NOW)
+
+    # histogram items are estimated at their largest size, synthetic ones are smaller
+    assert client.stats['write_units'] <= estimate['wcu'] <= client.stats['write_units'] * 1.2
+    assert client.stats['read_units'] <= estimate['rcu'] + 1 <= client.stats['read_units'] * 1.2 + 1
@@ -0,0 +1,118 @@
+from buoy.lib import dbquery
+from buoy.lib import querycache
+
+MONTHS = [1, 6, 12]
+MONTH_DAYS = ['0101', '0229', '0615', '1231']
+WAVE_HEIGHTS = [0.5, 1.73, 2.4, 4.0]
+
+
+def _scan_percentiles(db):
+    """
+    Month and month-day percentiles from full index scans, as computed without histogram items.
+    """
+    return ([dbquery.percentile(lambda k: db._query_month_page(month, k), 'waveheight', height)
+             for month in MONTHS for height in WAVE_HEIGHTS],
+            [dbquery.percentile(lambda k: db._query_month_day_page(month_day, k), 'waveheight', height)
+             for month_day in MONTH_DAYS for height in WAVE_HEIGHTS])
+
+
+def _percentiles(db):
+    return ([db.query_month_percentile(month, height) for month in MONTHS for height in WAVE_HEIGHTS],
+            [db.query_month_day_percentile(month_day, height) for month_day in MONTH_DAYS for height in WAVE_HEIGHTS])
+
+
+def _scan_summary(db):
+    items = list(db.query_items_after('0'))
+    heights = [float(item['waveheight']['N']) for item in items]
+    return {
+        'count': len(items),
+        'first': items[0]['time']['S'],
+        'latest': items[-1]['time']['S'],
+        'max': items[heights.index(max(heights))]['time']['S']
+    }
+
+
+def _summary(db):
+    current = db.get_summary()
+    return {
+        'count': current['count'],
+        'first': current['first'],
+        'latest': current['latest']['time']['S'],
+        'max': current['max']['time']['S']
+    }
+
+
+def test_histograms_match_scan(db, records):
+    db.write_stream(records[:20000])
+    db.rebuild_histograms()
+    db.write_conditional(records[20000:20500])
+    db.upsert(records[20400:21000])
+    db.write(records[21000:])
+    assert _percentiles(db) == _scan_percentiles(db)
+
+
+def test_histograms_not_created_from_writes_to_legacy_table(db, records):
+    db._write(records[:-100])
+    db.write_conditional(records[-100:])
+    assert _percentiles(db) == _scan_percentiles(db)
+    db.rebuild_histograms()
+    db.write_conditional(records[-50:])
+    assert _percentiles(db) == _scan_percentiles(db)
+
+
+def test_summary_matches_scan(db, records):
+    db.write_stream(records[:20000])
+    db.rebuild_summary()
+    db.write_conditional(records[20000:20500])
+    db.upsert(records[20400:21000])
+    db.write(records[21000:])
+    assert _summary(db) == _scan_summary(db)
+    assert db.find_latest()['time']['S'] == records[-1].time
+    assert float(db.find_max_wave_height()['waveheight']['N']) == max(record.wave_height for record in records)
+
+
+def test_summary_not_created_from_writes_to_legacy_table(db, records):
+    db._write(records[:-100])
+    db._write_index(records[:-100])
+    db.write_conditional(records[-100:])
+    assert db.get_summary() is None
+    assert float(db.find_max_wave_height()['waveheight']['N']) == max(record.wave_height for record in records)
+    db.rebuild_summary()
+    assert _summary(db) == _scan_summary(db)
+
+
+def test_query_cache_matches_scan(db, records):
+    db.write_stream(records[:20000])
+    db.cache = querycache.QueryCache()
+    before = _percentiles(db)
+    db.write_conditional(records[20000:])
+    assert before != _percentiles(db)
+    assert _percentiles(db) == _scan_percentiles(db)
+
+
+def _legacy_table(db, records):
+    """
+    Write records as a table loaded before year and year-month-day index, histogram and summary items existed.
+    """
+    db._write(records)
+    items = [item for item in db._convert_index_items(records) if item['id']['S'] == f'{db.buoy}/yearmonth']
+    db._write_index_items(items)
+
+
+def test_index_not_trusted_after_writes_to_legacy_table(db, records):
+    _legacy_table(db, records[:-200])
+    heights = sorted(record.wave_height for record in records[:-200])
+    thresholds = [heights[int(len(heights) * quantile)] for quantile in [0.5, 0.99, 0.9999]]
+    before = [db.find_last_occurrence_of(height)['time']['S'] for height in thresholds]
+    db.write_conditional(records[-200:])
+    expected = [max(record.time for record in records if record.wave_height > height) for height in thresholds]
+    assert [db.find_last_occurrence_of(height)['time']['S'] for height in thresholds] == expected
+    assert before[1:] == expected[1:]
+    assert float(db.find_max_wave_height()['waveheight']['N']) == max(record.wave_height for record in records)
+    assert float(db.find_max_since('2016')['waveheight']['N']) == \
+        max(record.wave_height for record in records if record.time >= '2016')
+
+    db.rebuild_index()
+    assert [db.find_last_occurrence_of(height)['time']['S'] for height in thresholds] == expected
+    assert float(db.find_max_since('2016030512')['waveheight']['N']) == \
+        max(record.wave_height for record in records if record.time >= '2016030512')
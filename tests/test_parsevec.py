@@ -0,0 +1,36 @@
+import pytest
+from buoy.lib import parse
+from buoy.lib import parsevec
+from buoy.lib import synthetic
+from buoy.lib.observation import FIELDS, TIME_FIELDS
+
+
+def _rows(records):
+    return [tuple(getattr(record, name) for name in FIELDS + TIME_FIELDS) for record in records]
+
+
+# one year per NOAA header format
+@pytest.mark.parametrize('year', [1995, 2002, 2006, 2015])
+def test_parse_normalize_filter_matches_parse(year):
+    data = synthetic.year_data(year)
+    assert _rows(parsevec.parse_normalize_filter(data)) == _rows(parse.parse_normalize_filter(data))
+
+
+@pytest.mark.parametrize('year', [1995, 2015])
+def test_parse_normalize_filter_complete_matches_parse(year):
+    data = synthetic.year_data(year)
+    assert _rows(parsevec.parse_normalize_filter_complete(data)) == _rows(parse.parse_normalize_filter_complete(data))
+
+
+REALTIME_DATA = """#YY  MM DD hh mm WDIR WSPD GST  WVHT   DPD   APD MWD   PRES  ATMP  WTMP  DEWP  VIS PTDY  TIDE
+#yr  mo dy hr mn degT m/s  m/s     m   sec   sec degT   hPa  degC  degC  degC  nmi  hPa    ft
+2024 05 02 18 50 300  8.0 10.0   1.9    10   7.1 290 1012.9  12.1  11.6   9.9   MM   MM    MM
+2024 05 02 18 20 300  8.0 10.0    MM    MM    MM  MM 1012.9  12.1  11.6   9.9   MM   MM    MM
+2024 05 02 17 50 300  8.0 10.0   1.8    MM   7.0 290 1012.9  12.1  11.6   9.9   MM   MM    MM
+2024 05 02 17 20 300  8.0 10.0   1.8    11    MM 290 1012.9  12.1  11.6   9.9   MM   MM    MM
+"""
+
+
+# realtime files used by loadlast5 and loadlast45 are newest first with several observations per hour
+def test_parse_normalize_filter_realtime_matches_parse():
+    assert _rows(parsevec.parse_normalize_filter(REALTIME_DATA)) == _rows(parse.parse_normalize_filter(REALTIME_DATA))
@@ -0,0 +1,67 @@
+import copy
+import pytest
+from buoy.lib import snapshot
+from buoy.lib import sqlitedb
+from conftest import BUOY
+
+HEIGHTS = [0.5, 2.0, 4.5, 100.0]
+MONTH_DAYS = ['0101', '0229', '0230', '0315']
+
+
+def _with(records, **values):
+    """
+    Copies of observation records with attribute values replaced.
+    """
+    changed = []
+    for record in records:
+        record = copy.copy(record)
+        for name, value in values.items():
+            setattr(record, name, value(record) if callable(value) else value)
+        changed.append(record)
+    return changed
+
+
+def _load(storage, records, rebuild):
+    """
+    Write observations missing dominant period, then upsert zero dominant periods, which are stored as missing,
+    complete observations and new observations, each with a changed wave height so that writes are visible.
+    """
+    storage.write(_with(records[:1000], dominant_period=None) + records[1000:2000])
+    rebuild(storage)
+    higher = {'wave_height': lambda record: round(record.wave_height + 1, 2)}
+    storage.upsert(_with(records[:500], dominant_period=0.0, **higher) +
+                   _with(records[500:1000], **higher) +
+                   _with(records[1500:2000], average_period=None, **higher) +
+                   records[2000:2500])
+
+
+def _row(item):
+    return snapshot.decode(item) if item else None
+
+
+def _answers(storage):
+    return {
+        'items': [_row(item) for item in storage.query_items_after('0')],
+        'latest': _row(storage.find_latest()),
+        # without a summary item, DynamoDB answers with the index item of the period holding the maximum
+        'max': float(storage.find_max_wave_height()['waveheight']['N']),
+        'last': [_row(storage.find_last_occurrence_of(height)) for height in HEIGHTS],
+        'month': [storage.query_month_percentile(month, height) for month in range(1, 13) for height in HEIGHTS],
+        'monthday': [storage.query_month_day_percentile(month_day, height)
+                     for month_day in MONTH_DAYS for height in HEIGHTS]
+    }
+
+
+def _rebuild_all(db):
+    db.rebuild_histograms()
+    db.rebuild_summary()
+    db.rebuild_index()
+
+
+@pytest.mark.parametrize('rebuild', [lambda db: None, _rebuild_all], ids=['legacy', 'rebuilt'])
+def test_dynamo_and_sqlite_answers_match(tmp_path, db, records, rebuild):
+    target = sqlitedb.SqliteDb(str(tmp_path / 'buoys.db'), BUOY)
+    _load(db, records, rebuild)
+    _load(target, records, lambda storage: None)
+    assert _answers(target) == _answers(db)
+    target.close()
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+from buoy.lib import trace
+
+
+def _work(n):
+    with trace.span(f'inner {n}'):
+        return sum(range(10000))
+
+
+def test_profiled_session_with_threads(tmp_path):
+    with trace.session('test', str(tmp_path)) as root:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [trace.submit(executor, f'job {n}', _work, n) for n in range(8)]
+            assert [future.result() for future in futures] == [sum(range(10000))] * 8
+    assert len(root.children) == 8
+    assert all(child.peak is not None for child in root.children)
+    suffixes = sorted(path.name.split('.', 1)[1] for path in tmp_path.iterdir())
+    assert suffixes == ['folded', 'memory.txt', 'prof']
+
+
+def test_describe_unfinished_span():
+    span = trace.Span('unfinished', None)
+    assert span.describe() == 'wall 0.0 ms, cpu 0.0 ms'
+
+
+class _ActiveProfile:
+    def enable(self):
+        raise ValueError('Another profiling tool is already active')
+
+
+def test_profiled_session_when_another_profiler_is_active(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace.cProfile, 'Profile', _ActiveProfile)
+    with trace.session('test', str(tmp_path)):
+        _work(0)
+    assert sorted(path.name.split('.', 1)[1] for path in tmp_path.iterdir()) == ['folded', 'memory.txt']